@@ -0,0 +1,482 @@
+# Benchmark suite for the processing pipeline.
+#
+# Measures each stage (opening VSS_File, DataframeAsList, vibration reads, band energies, full processing)
+# on a synthetic dataset with the real schema (see synthetic_dataset.py) or on a real HDF5 file, reports
+# per-stage throughput (tests/s, MB decompressed/s, slices/s) and saves the results as JSON, so runs on
+# different commits can be compared.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.run_benchmarks [--dataset file.hdf5] [--tests 8] [--only read_block ...] [--compare old.json]
+#
+# Results are written to benchmarks/results/<date>-<commit>.json (or --output). New benchmarks are
+# registered with the @benchmark decorator and receive a BenchmarkContext.
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+
+os.environ.setdefault('TQDM_DISABLE', '1')  # keep progress bars out of the report
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from src.core.database import VSS_File
+from src.core.metadata_index import _index_paths
+from src.core.dataset_utils import get_filter_attributes
+from benchmarks.synthetic_dataset import generate_dataset
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Registers a benchmark function fn(ctx) -> dict of metrics under name."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+def best_time(fn, repeat):
+    """Best wall time of repeat calls of fn, and the result of the last call."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+class BenchmarkContext:
+    """Dataset under test and the common options shared by all benchmarks."""
+    def __init__(self, path, num_tests, repeat, opts):
+        self.path = path
+        self.repeat = repeat
+        self.opts = opts
+        self.dataset = VSS_File(path)
+        self.testNames = list(self.dataset.metadataIndex['test'][:num_tests])
+
+    def tests(self):
+        return [self.dataset.returnTestReference(name) for name in self.testNames]
+
+    def slice_length(self, test):
+        return test._h5ref['vibrationMeasurements'].size // 3 // self.opts['num_slices']
+
+
+@benchmark('open')
+def bench_open(ctx):
+    def open_cold():
+        for path in _index_paths(ctx.path):
+            if os.path.exists(path):
+                os.remove(path)
+        return VSS_File(ctx.path)
+    cold, dataset = best_time(open_cold, 1)
+    warm, dataset = best_time(lambda: VSS_File(ctx.path), ctx.repeat)
+    numTests = len(dataset.metadataIndex['test'])
+    return {'cold_s': cold, 'warm_s': warm, 'tests': numTests, 'tests/s': numTests / warm}
+
+# Run in a fresh interpreter: what process_dataset.py does before the first test is processed
+STARTUP_PROBE = '''
+import sys, time
+start = time.perf_counter()
+import process_dataset
+from src.processing.registry import get_processing_class
+from src.core.database import VSS_File
+get_processing_class(sys.argv[2])
+tests = VSS_File(sys.argv[1]).DataframeAsList({})
+tests[0].returnAttributeDict()
+print(time.perf_counter() - start)
+'''
+STARTUP_TARGET_S = 1.0
+
+@benchmark('startup')
+def bench_startup(ctx):
+    root = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+    def probe():
+        output = subprocess.run([sys.executable, '-c', STARTUP_PROBE, ctx.path, 'bandas_fft'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout
+        return float(output.split()[-1])
+    times = [probe() for _ in range(ctx.repeat)]
+    return {'seconds': min(times), 'target_s': STARTUP_TARGET_S, 'within_target': min(times) <= STARTUP_TARGET_S}
+
+@benchmark('filter')
+def bench_filter(ctx):
+    with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'configs', 'slices.json')) as f:
+        sliceNames = list(json.load(f))
+    seconds, matches = best_time(lambda: [ctx.dataset.DataframeAsList(get_filter_attributes(name)) for name in sliceNames], ctx.repeat)
+    # The indexed path must return the same tests, in the same order, as walking the groups (units in reverse order too)
+    with VSS_File(ctx.dataset.path, useIndex=False) as walked:
+        units = [unit.name for unit in walked.units][::-1]
+        for name in sliceNames:
+            for selectedUnits in (None, units):
+                indexed = [test.name for test in ctx.dataset.DataframeAsList(get_filter_attributes(name), selectedUnits)]
+                if indexed != [test.name for test in walked.DataframeAsList(get_filter_attributes(name), selectedUnits)]:
+                    raise AssertionError(f'Indexed DataframeAsList differs from the group walk for slice {name} (units {selectedUnits})')
+    return {'seconds': seconds, 'slices': len(sliceNames), 'queries/s': len(sliceNames) / seconds,
+            'matches': sum(len(match) for match in matches)}
+
+def _read_metrics(seconds, numTests, nbytes):
+    return {'seconds': seconds, 'tests/s': numTests / seconds, 'MB/s': nbytes / seconds / 1e6}
+
+@benchmark('read_axis')
+def bench_read_axis(ctx):
+    n = ctx.opts['num_slices']
+    def read():
+        return sum(np.asarray(test.splitVibrationWaveform(n, axis)).nbytes for test in ctx.tests() for axis in 'xyz')
+    seconds, nbytes = best_time(read, ctx.repeat)
+    return _read_metrics(seconds, len(ctx.testNames), nbytes)
+
+@benchmark('read_block')
+def bench_read_block(ctx):
+    n = ctx.opts['num_slices']
+    seconds, nbytes = best_time(lambda: sum(test.splitVibrationBlock(n).nbytes for test in ctx.tests()), ctx.repeat)
+    return _read_metrics(seconds, len(ctx.testNames), nbytes)
+
+@benchmark('threaded_read')
+def bench_threaded_read(ctx):
+    """splitVibrationBlock of every test from a thread pool (per-thread file handles) with 1, 2, 4 and 8 threads."""
+    from concurrent.futures import ThreadPoolExecutor
+    n = ctx.opts['num_slices']
+    tests = ctx.tests()
+    expected = [test.splitVibrationBlock(n) for test in tests]
+    metrics = {'cpus': os.cpu_count()}
+    for threads in (1, 2, 4, 8):
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            seconds, blocks = best_time(lambda: list(executor.map(lambda test: test.splitVibrationBlock(n), tests)), ctx.repeat)
+        if not all(np.array_equal(a, e) for a, e in zip(blocks, expected)):
+            raise AssertionError(f'Blocks read with {threads} threads differ from the serial reads')
+        metrics[f'{threads}_threads_MB/s'] = sum(block.nbytes for block in blocks) / seconds / 1e6
+    metrics['scaling_8_threads'] = metrics['8_threads_MB/s'] / metrics['1_threads_MB/s']
+    return metrics
+
+@benchmark('read_window')
+def bench_read_window(ctx):
+    """One slice per test with returnVibrationSlice against reading the whole block and indexing it."""
+    n = ctx.opts['num_slices']
+    full, _ = best_time(lambda: [test.splitVibrationBlock(n)[n // 2] for test in ctx.tests()], ctx.repeat)
+    window, nbytes = best_time(lambda: sum(test.returnVibrationSlice(n // 2, n).nbytes for test in ctx.tests()), ctx.repeat)
+    return {'full_s': full, 'slice_s': window, 'speedup': full / window, 'MB/s': nbytes / window / 1e6}
+
+@benchmark('extract_metadata')
+def bench_extract_metadata(ctx):
+    """extract_metadata reading numericalMeasurements against the summary attrs stored by backfill_summaries."""
+    import shutil
+    from src.processing.processing_classes import BaseProcessing
+    from src.utils.backfill_summaries import backfill_summaries
+    processing = BaseProcessing('benchmark', [], ctx.opts)
+    computed, _ = best_time(lambda: [processing.extract_metadata(test) for test in ctx.tests()], ctx.repeat)
+    with tempfile.TemporaryDirectory() as tmpDir:
+        path = os.path.join(tmpDir, 'summaries.hdf5')
+        shutil.copy(ctx.path, path)
+        backfill_summaries(path, force=True)
+        dataset = VSS_File(path, useIndex=False)
+        tests = [dataset.returnTestReference(name) for name in ctx.testNames]
+        stored, _ = best_time(lambda: [processing.extract_metadata(test) for test in tests], ctx.repeat)
+        dataset.close()
+    return {'computed_s': computed, 'stored_s': stored, 'speedup': computed / stored}
+
+def _blocks(ctx):
+    return [test.splitVibrationBlock(ctx.opts['num_slices']) for test in ctx.tests()]
+
+@benchmark('ahryman_filter')
+def bench_ahryman_filter(ctx):
+    from src.processing.fft import ahryman_filter
+    blocks = _blocks(ctx)
+    t = 10 / ctx.opts['num_slices']
+    def run():
+        for block in blocks:
+            for vib_slice in block:
+                for axis in vib_slice:
+                    ahryman_filter(axis, t=t, dur=ctx.opts['dur'], sup=ctx.opts['sup'])
+    seconds, _ = best_time(run, ctx.repeat)
+    numSlices = sum(len(block) for block in blocks)
+    return {'seconds': seconds, 'slices/s': numSlices / seconds}
+
+@benchmark('band_energies')
+def bench_band_energies(ctx):
+    from src.processing.fft import band_energies
+    blocks = _blocks(ctx)
+    t = 10 / ctx.opts['num_slices']
+    seconds, _ = best_time(lambda: [band_energies(block, t=t, dur=ctx.opts['dur'], sup=ctx.opts['sup']) for block in blocks], ctx.repeat)
+    numSlices = sum(len(block) for block in blocks)
+    return {'seconds': seconds, 'slices/s': numSlices / seconds}
+
+def _bench_process(ctx, className):
+    from src.processing import processing_classes
+    ProcessingClass = getattr(processing_classes, className)
+    seconds, df = best_time(lambda: ProcessingClass('benchmark', ctx.tests(), ctx.opts).process(), ctx.repeat)
+    return {'seconds': seconds, 'tests/s': len(ctx.testNames) / seconds, 'slices/s': len(df) / seconds}
+
+def _legacy_raw_fft(y):
+    """raw_fft as it was before the FFT backend layer: complex FFT of real data plus full-length temporaries."""
+    size = len(y)
+    P2 = np.abs(np.fft.fft(y) / size)
+    ft = P2[:size // 2 + 1]
+    ft[1:-1] = 2 * ft[1:-1]
+    return ft
+
+def _allocated_bytes(fn):
+    """Peak memory allocated (as seen by tracemalloc, which NumPy reports to) while running fn once."""
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+@benchmark('fft_backend')
+def bench_fft_backend(ctx):
+    """Per-slice spectra with the old np.fft.fft code against rfft with every installed backend."""
+    from src.processing import fft
+    axes = [axis for block in _blocks(ctx) for vib_slice in block for axis in vib_slice]
+    metrics = {}
+    seconds, _ = best_time(lambda: [_legacy_raw_fft(axis) for axis in axes], ctx.repeat)
+    metrics['legacy_slices/s'] = len(axes) / seconds
+    metrics['legacy_alloc_B'] = _allocated_bytes(lambda: _legacy_raw_fft(axes[0]))
+    t = 10 / ctx.opts['num_slices']
+    for backend in fft.FFT_BACKENDS[1:]:
+        try:
+            fft.set_fft_backend(backend)
+            fft.fft_backend()
+        except ImportError:
+            continue
+        seconds, _ = best_time(lambda: [fft.raw_fft(axis) for axis in axes], ctx.repeat)
+        metrics[f'{backend}_slices/s'] = len(axes) / seconds
+        metrics[f'{backend}_speedup'] = metrics[f'{backend}_slices/s'] / metrics['legacy_slices/s']
+        # Band energies reuse the workspace buffer: what is left is the (small) band output
+        fft.band_energies(axes[0], t=t, dur=ctx.opts['dur'], sup=ctx.opts['sup'])
+        metrics[f'{backend}_band_alloc_B'] = _allocated_bytes(lambda: fft.band_energies(axes[0], t=t, dur=ctx.opts['dur'], sup=ctx.opts['sup']))
+    fft.set_fft_backend()
+    return metrics
+
+# Largest band energy deviation of the float32 path accepted by the precision check, in dB
+FLOAT32_DB_TOLERANCE = 0.01
+
+@benchmark('float32_precision')
+def bench_float32_precision(ctx):
+    """bandas_fft with 'precision': 'float32' against the float64 path: speed and band energy deviation in dB."""
+    from src.processing.processing_classes import bandas_fft
+    def run(precision):
+        processing = bandas_fft('benchmark', [], {**ctx.opts, 'precision': precision})
+        return [processing.process_test(test) for test in ctx.tests()]
+    seconds64, columns64 = best_time(lambda: run('float64'), ctx.repeat)
+    seconds32, columns32 = best_time(lambda: run('float32'), ctx.repeat)
+    deviation = 0.0
+    for c64, c32 in zip(columns64, columns32):
+        for axis in 'xyz':
+            assert c32[axis].dtype == np.float32
+            valid = (c64[axis] > 0) & (c32[axis] > 0)
+            deviation = max(deviation, float(np.max(np.abs(10 * np.log10(c32[axis][valid] / c64[axis][valid])), initial=0)))
+    if deviation > FLOAT32_DB_TOLERANCE:
+        raise AssertionError(f'float32 band energies deviate by {deviation:.3g} dB (tolerance {FLOAT32_DB_TOLERANCE} dB)')
+    return {'float64_s': seconds64, 'float32_s': seconds32, 'speedup': seconds64 / seconds32,
+            'max_dev_dB': deviation, 'tolerance_dB': FLOAT32_DB_TOLERANCE}
+
+@benchmark('batched_slices')
+def bench_batched_slices(ctx):
+    """Batched process_slices of TimeStatsProcessing against the per-slice process_slice fallback."""
+    from src.processing.processing_classes import BaseProcessing, TimeStatsProcessing
+    processing = TimeStatsProcessing('benchmark', [], ctx.opts)
+    blocks = _blocks(ctx)
+    perSlice, expected = best_time(lambda: [BaseProcessing.process_slices(processing, block, None) for block in blocks], ctx.repeat)
+    batched, actual = best_time(lambda: [processing.process_slices(block, None) for block in blocks], ctx.repeat)
+    deviation = max(np.max(np.abs(a[key] - e[key]) / np.maximum(np.abs(e[key]), 1e-300)) for a, e in zip(actual, expected) for key in e)
+    return {'per_slice_s': perSlice, 'batched_s': batched, 'speedup': perSlice / batched, 'max_rel_dev': float(deviation)}
+
+@benchmark('spectrogram')
+def bench_spectrogram(ctx):
+    """Per-frame raw_fft loop over every slice and axis against the batched strided STFT of SpectrogramProcessing."""
+    from src.processing.processing_classes import SpectrogramProcessing
+    from src.processing.fft import raw_fft
+    from src.processing.timefreq import frame_window
+    opts = {'num_slices': ctx.opts['num_slices'], 'frame_length': 2048, 'hop': 1024, 'window': 'hann'}
+    processing = SpectrogramProcessing('benchmark', [], opts)
+    blocks = _blocks(ctx)
+    window = frame_window('hann', 2048)
+    def loop(block):
+        starts = range(0, block.shape[-1] - 2048 + 1, 1024)
+        return np.array([[[raw_fft(signal[i:i + 2048] * window) ** 2 for i in starts] for signal in axes] for axes in block])
+    perFrame, expected = best_time(lambda: [loop(block) for block in blocks], ctx.repeat)
+    batched, actual = best_time(lambda: [processing.process_slices(block, None) for block in blocks], ctx.repeat)
+    deviation = max(np.max(np.abs(a[axis] - e[:, i]) / np.max(e[:, i])) for a, e in zip(actual, expected) for i, axis in enumerate('xyz'))
+    return {'per_frame_s': perFrame, 'batched_s': batched, 'speedup': perFrame / batched, 'max_rel_dev': float(deviation)}
+
+@benchmark('streaming')
+def bench_streaming(ctx):
+    """
+    Replays the recordings through StreamingExtractor in 0.1 s chunks: checks the rows are bit-identical to the
+    batch path (also with chunks that don't divide a slice, chunks spanning several slices and a ring smaller
+    than the recording, so it wraps) and reports how many x/y/z channels of live 51.2 kHz data one core keeps up with.
+    """
+    from src.processing.processing_classes import bandas_fft, TimeStatsProcessing
+    from src.processing.streaming import StreamingExtractor, replay_test
+    from src.core.database import VIBRATION_FS
+    chunk = VIBRATION_FS // 10
+    tests = ctx.tests()
+    signals = [test.returnVibrationArray(("x", "y", "z")) for test in tests]
+    sliceLength = signals[0].shape[1] // ctx.opts['num_slices']
+    # (chunk size, ring capacity) pairs replayed for the check
+    replays = [(chunk, 4), (3001, 4), (3001, 2), (3 * sliceLength + 777, 2)]
+    metrics = {}
+    for label, cls in (('bandas_fft', bandas_fft), ('time_stats', TimeStatsProcessing)):
+        processing = cls('benchmark', [], ctx.opts)
+        for test in tests:
+            for chunkSize, capacity in replays:
+                streamed, batch = replay_test(processing, test, chunkSize, capacity)
+                if list(streamed) != list(batch) or not all(np.array_equal(streamed[key], batch[key]) for key in batch):
+                    raise AssertionError(f'{label} rows streamed in chunks of {chunkSize} (ring of {capacity}) '
+                                         f'differ from the batch rows of {test.name}')
+        def stream():
+            for signal in signals:
+                extractor = StreamingExtractor(processing, signal.shape[1] // ctx.opts['num_slices'])
+                for start in range(0, signal.shape[1], chunk):
+                    extractor.push(signal[:, start:start + chunk])
+        seconds, _ = best_time(stream, ctx.repeat)
+        realtime = sum(signal.shape[1] for signal in signals) / VIBRATION_FS / seconds
+        metrics[f'{label}_realtime_factor'] = realtime
+        metrics[f'{label}_channels_per_core'] = 3 * realtime
+    return metrics
+
+@benchmark('prefetch')
+def bench_prefetch(ctx):
+    """Serial bandas_fft run reading each test synchronously against reading ahead on the I/O thread."""
+    from src.processing.processing_classes import bandas_fft
+    metrics = {}
+    for label, read_ahead in (('sync', 0), ('read_ahead_2', 2)):
+        seconds, _ = best_time(lambda: bandas_fft('benchmark', ctx.tests(), ctx.opts).process(read_ahead=read_ahead), ctx.repeat)
+        metrics[f'{label}_tests/s'] = len(ctx.testNames) / seconds
+    metrics['speedup'] = metrics['read_ahead_2_tests/s'] / metrics['sync_tests/s']
+    return metrics
+
+@benchmark('profiling_overhead')
+def bench_profiling_overhead(ctx):
+    """bandas_fft run without and with the --profile stage timers installed."""
+    from src.core.profiling import Profiler
+    from src.processing.processing_classes import bandas_fft
+    def run(profile):
+        if not profile:
+            return bandas_fft('benchmark', ctx.tests(), ctx.opts).process()
+        with Profiler() as profiler:
+            profiler.instrument(bandas_fft)
+            return bandas_fft('benchmark', ctx.tests(), ctx.opts).process()
+    off, _ = best_time(lambda: run(False), ctx.repeat)
+    on, _ = best_time(lambda: run(True), ctx.repeat)
+    return {'off_s': off, 'on_s': on, 'overhead': on / off - 1}
+
+@benchmark('config_sweep')
+def bench_config_sweep(ctx):
+    """Separate bandas_fft runs for several band layouts against one ConfigSweep pass sharing reads and FFTs."""
+    from src.processing.processing_classes import bandas_fft, ConfigSweep
+    optsList = [dict(ctx.opts, dur=dur, sup=sup) for dur, sup in ((200, 0.1), (100, 0.1), (50, 0.2), (20, 0.1))]
+    separate, expected = best_time(lambda: [bandas_fft('benchmark', ctx.tests(), opts).process() for opts in optsList], ctx.repeat)
+    sweep, actual = best_time(lambda: ConfigSweep(bandas_fft, 'benchmark', ctx.tests(), optsList).process(), ctx.repeat)
+    identical = all(np.array_equal(np.stack(a[key].to_numpy()), np.stack(e[key].to_numpy()))
+                    for a, e in zip(actual, expected) for key in e.columns)
+    if not identical:
+        raise AssertionError('ConfigSweep rows differ from separate bandas_fft runs')
+    return {'configs': len(optsList), 'separate_s': separate, 'sweep_s': sweep, 'speedup': separate / sweep, 'identical': identical}
+
+@benchmark('feature_store')
+def bench_feature_store(ctx):
+    """Train-set gather from a pickled DataFrame (unpickle + np.stack) against the memory-mapped .npy store."""
+    from src.processing.processing_classes import bandas_fft
+    from src.core.npy_store import NpyFeatureWriter, FeatureStore
+    import pandas as pd
+    processing = bandas_fft('benchmark', ctx.tests(), ctx.opts)
+    with tempfile.TemporaryDirectory() as tmpDir:
+        pklPath, storePath = os.path.join(tmpDir, 'features.pkl'), os.path.join(tmpDir, 'store')
+        processing.process().to_pickle(pklPath)
+        with NpyFeatureWriter(storePath) as writer:
+            processing.process(writer=writer)
+        numRows = len(FeatureStore(storePath))
+        indices = np.sort(np.random.default_rng(0).choice(numRows, int(0.8 * numRows), replace=False))
+        def from_pickle():
+            df = pd.read_pickle(pklPath)
+            return np.stack(df['x'].to_numpy())[indices]
+        def from_store():
+            return FeatureStore(storePath).rows(indices, ['x'])['x']
+        pickled, expected = best_time(from_pickle, ctx.repeat)
+        mapped, actual = best_time(from_store, ctx.repeat)
+        assert np.array_equal(expected, actual)
+    return {'pickle_s': pickled, 'memmap_s': mapped, 'speedup': pickled / mapped, 'rows': len(indices)}
+
+@benchmark('process_bandas_fft')
+def bench_process_bandas_fft(ctx):
+    return _bench_process(ctx, 'bandas_fft')
+
+@benchmark('process_time_stats')
+def bench_process_time_stats(ctx):
+    return _bench_process(ctx, 'TimeStatsProcessing')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+def compare(results, baselinePath):
+    """Prints the ratio new/old of every metric shared with a previous results file."""
+    with open(baselinePath) as f:
+        baseline = json.load(f)
+    print(f"\nComparison against {baselinePath} (commit {baseline.get('commit')}), new/old:")
+    for name, metrics in results['results'].items():
+        for key, value in metrics.items():
+            old = baseline.get('results', {}).get(name, {}).get(key)
+            if isinstance(old, (int, float)) and old and isinstance(value, (int, float)):
+                print(f'  {name:>20} {key:>10}: {value / old:6.2f}x')
+
+def run(path, names, num_tests, repeat, opts):
+    ctx = BenchmarkContext(path, num_tests, repeat, opts)
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name](ctx)
+        print(f'{name:>20}: ' + ', '.join(f'{key}={value:.4g}' if isinstance(value, float) else f'{key}={value}'
+                                           for key, value in results[name].items()))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the VSS processing pipeline.')
+    parser.add_argument('--dataset', default=None, help='HDF5 dataset (default: a synthetic one in a temporary folder)')
+    parser.add_argument('--tests', type=int, default=8, help='Number of tests used by the per-test benchmarks')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per benchmark (best time is reported)')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), default=None, help='Benchmarks to run')
+    parser.add_argument('--config', default='mais_bandas', help='Entry of configs/processing_configs.json to use')
+    parser.add_argument('--output', default=None, help='JSON results file (default: benchmarks/results/<date>-<commit>.json)')
+    parser.add_argument('--compare', default=None, help='Previous JSON results file to compare against')
+    args = parser.parse_args()
+
+    with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'configs', 'processing_configs.json')) as f:
+        opts = json.load(f)[args.config]
+    names = args.only or list(BENCHMARKS)
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        path = args.dataset
+        if path is None:
+            path = os.path.join(tmpDir, 'synthetic.hdf5')
+            generate_dataset(path, units=(1, 2), rpms=(2100, 3600), conditions=[('20', '44'), ('20', '35,5')])
+        results = {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'host': socket.gethostname(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'dataset': args.dataset or 'synthetic',
+            'config': args.config,
+            'results': run(path, names, args.tests, args.repeat, opts),
+        }
+
+    output = args.output or os.path.join(os.path.dirname(os.path.realpath(__file__)), 'results',
+                                         f"{time.strftime('%Y%m%d-%H%M%S')}-{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results saved to: {output}')
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,71 @@
+# Generates a synthetic HDF5 file with the same schema as the real dataset (see convert_from_files.py),
+# so the processing pipeline can be benchmarked without sharing the measurements:
+#   /<unit>/<type><unit>-<rpm>-<repetition>-x-<evap>-<cond>  test groups with the string attrs
+#   type, angularSpeed, repetition, evaporatingTemperature and condensingTemperature,
+#   vibrationMeasurements: (seconds * Fs, 3) float64, gzip+shuffle, columnNames x/y/z
+#   numericalMeasurements: (seconds, 11) float64, gzip+shuffle, columnNames as in convert_from_files.py
+#
+# Usage (from the repository root):
+#   python -m benchmarks.synthetic_dataset <output.hdf5> [--units 1 2] [--rpms 2100 3600] [--seconds 10]
+
+import argparse
+import h5py
+import numpy as np
+
+NUM_COLUMNS = ['rpm', 't_evap_ref', 't_cond_ref', 't_evap', 't_cond', 't_suc', 't_comp', 't_dis', 'p_suc', 'p_int', 'p_dis']
+CONDITIONS = [('20', '44'), ('20', '35,5'), ('10', '54')]  # (evaporating, condensing) as written in the file names
+
+def synthetic_vibration(rng, rpm, numSamples, Fs):
+    """Rotation harmonics plus broadband noise, different for every axis."""
+    t = np.arange(numSamples) / Fs
+    f0 = rpm / 60
+    data = 0.05 * rng.standard_normal((numSamples, 3))
+    for harmonic in range(1, 6):
+        for axis in range(3):
+            data[:, axis] += rng.uniform(0.1, 1) / harmonic * np.sin(2 * np.pi * harmonic * f0 * t + rng.uniform(0, 2 * np.pi))
+    return data
+
+def generate_dataset(path, units=(1, 2, 3, 4, 5), rpms=(2100, 2850, 3600), conditions=CONDITIONS,
+                     types=('A',), repetitions=1, seconds=10, Fs=51200, seed=0):
+    """Writes the synthetic dataset to path and returns the number of tests written."""
+    rng = np.random.default_rng(seed)
+    numTests = 0
+    with h5py.File(path, 'w') as f:
+        for unit in units:
+            unitGrp = f.create_group(str(unit))
+            for testType in types:
+                for rpm in rpms:
+                    for evap, cond in conditions:
+                        for repetition in range(1, repetitions + 1):
+                            testGrp = unitGrp.create_group(f'{testType}{unit}-{rpm}-{repetition}-x-{evap}-{cond}')
+                            testGrp.attrs['type'] = testType
+                            testGrp.attrs['angularSpeed'] = str(rpm)
+                            testGrp.attrs['repetition'] = str(repetition)
+                            testGrp.attrs['evaporatingTemperature'] = evap
+                            testGrp.attrs['condensingTemperature'] = cond
+
+                            vibMeas = testGrp.create_dataset("vibrationMeasurements", data=synthetic_vibration(rng, rpm, seconds * Fs, Fs),
+                                                             compression="gzip", shuffle=True)
+                            vibMeas.attrs['columnNames'] = ['x', 'y', 'z']
+
+                            numData = rng.normal(size=(seconds, len(NUM_COLUMNS)))
+                            numData[:, 0] += rpm
+                            numData[:, 1:5] += [-float(evap), float(cond.replace(',', '.')), -float(evap), float(cond.replace(',', '.'))]
+                            numMeas = testGrp.create_dataset("numericalMeasurements", data=numData, compression="gzip", shuffle=True)
+                            numMeas.attrs['columnNames'] = NUM_COLUMNS
+                            numTests += 1
+    return numTests
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic VSS HDF5 dataset.')
+    parser.add_argument('output', help='HDF5 file to write')
+    parser.add_argument('--units', type=int, nargs='+', default=[1, 2, 3, 4, 5])
+    parser.add_argument('--rpms', type=int, nargs='+', default=[2100, 2850, 3600])
+    parser.add_argument('--repetitions', type=int, default=1)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    numTests = generate_dataset(args.output, args.units, args.rpms, repetitions=args.repetitions,
+                                seconds=args.seconds, seed=args.seed)
+    print(f'Wrote {numTests} synthetic tests to {args.output}')
@@ -1,62 +1,156 @@
 # This script converts the original CSV data files (raw experimental data) into a structured HDF5 dataset for vibration-based soft sensing experiments.
 # It reads vibration and numerical measurement CSVs for each compressor unit and test, and stores them in a compressed, queryable HDF5 format.
+#
+# The CSVs are parsed (and the vibration data compressed) in parallel worker processes; the main process is the only
+# writer and owns the h5py.File, receiving each parsed test as soon as a worker finishes it.
+# Per-test summary statistics (see src/core/test_summary.py) are computed while the data is in memory and stored
+# as attrs, so processing runs don't need to read numericalMeasurements for them.
+#
+# Usage:
+#   python convert_from_files.py --data-folder D:/Rafael/Dados [--output D:/Rafael/Dados/dataset3.hdf5] [--workers N] [--incremental]
+#
+# Arguments:
+#   --data-folder  Folder with the 'Dat' (numerical) and 'Vib' (vibration) CSV subfolders
+#   --output       HDF5 file to create (default: <data-folder>/dataset3.hdf5)
+#   --workers      Number of parsing processes (default: number of CPUs)
+#   --incremental  Open an existing output and only convert the tests that are not there yet
 
 import os
 import re
-import csv
-import h5py
-import warnings
+import zlib
+import argparse
 import tqdm
+import h5py
 import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-# Path to the folder containing the original CSV data
-dataFolder = "D:/Rafael/Dados"
+from src.core.test_summary import numerical_summary, vibration_rms, write_summary_attrs
 
-# List all files in the 'Dat' subfolder (numerical data)
-allUnitsFolder = os.listdir(dataFolder+"/Dat")
+VIB_COLUMNS = ['x', 'y', 'z']
+NUM_COLUMNS = ['rpm', 't_evap_ref', 't_cond_ref', 't_evap', 't_cond', 't_suc', 't_comp', 't_dis', 'p_suc', 'p_int', 'p_dis']
 
-# Extract unique compressor unit identifiers from filenames
-allUnits = [re.findall("A.", unit) for unit in allUnitsFolder]  # Get all folder names with "Unidade"
-allUnits = set([name[0][-1] for name in allUnits if len(name)>0])  # Filter for unique models
-
-# Create a new HDF5 file to store the processed dataset
-with h5py.File(f"{dataFolder}/dataset3.hdf5", "w") as fModel:
-    # Iterate over each compressor unit
-    for unitNum in tqdm.tqdm(allUnits,desc = "Compressor", position=0):
-        # Create a group in the HDF5 file for this compressor unit
-        unitGrp = fModel.create_group(unitNum)
+# vibrationMeasurements chunks: one column and one second at 51.2 kHz (a slice when a 10 s test is split in 10)
+VIB_CHUNK_ROWS = 51200
+GZIP_LEVEL = 4  # h5py's default gzip level
 
+def find_tests(dataFolder):
+    """Returns (unitNum, testFile) for every test, in the conversion order (unit, then map A/B)."""
+    # List all files in the 'Dat' subfolder (numerical data)
+    allUnitsFolder = os.listdir(dataFolder + "/Dat")
+    # Extract unique compressor unit identifiers from filenames
+    allUnits = [re.findall("A.", unit) for unit in allUnitsFolder]  # Get all folder names with "Unidade"
+    allUnits = sorted(set([name[0][-1] for name in allUnits if len(name) > 0]))  # Filter for unique models
+    tests = []
+    for unitNum in allUnits:
         # Iterate over test types (e.g., 'A' = main map, 'B' = secondary map)
-        for testType in tqdm.tqdm(['A','B'], desc = "   Mapa", leave=False, position=1):
-            # Find all files for this unit and test type
+        for testType in ['A', 'B']:
             r = re.compile(f"{testType}{unitNum}.*")
-            unitFiles = list(filter(r.match,allUnitsFolder))
-
-            # For each test (experimental run)
-            for testFile in tqdm.tqdm(unitFiles, desc = "      Teste", leave=False, position=2):
-                testName = os.path.splitext(testFile)[0]
-                # Create a group for this test
-                testGrp = unitGrp.create_group(testName)
-
-                # Parse test metadata from the filename
-                testTags = testName.replace("[","").replace("]","").split("-")
-                testGrp.attrs['type'] = testTags[0][0]  # Test type (A or B)
-                testGrp.attrs['angularSpeed'] = testTags[1]  # Compressor speed
-                testGrp.attrs['repetition'] = testTags[2]  # Repetition index
-                testGrp.attrs['evaporatingTemperature'] = testTags[4]  # Evaporating temp
-                testGrp.attrs['condensingTemperature'] = testTags[5]  # Condensing temp
-
-                # --- Read and store the original CSV data ---
-                # Vibration data (x, y, z axes)
-                vibData = pd.read_table(f'{dataFolder}/Vib/{testFile}', delimiter = ';', decimal = '.', encoding='ANSI', header = None, names=['x', 'y', 'z'])
-                # Numerical measurements (temperatures, pressures, etc.)
-                numData = pd.read_table(f'{dataFolder}/Dat/{testFile}', delimiter = ';', decimal = '.', encoding='ANSI', header = None, names=['rpm', 't_evap_ref', 't_cond_ref','t_evap','t_cond','t_suc','t_comp','t_dis','p_suc','p_int','p_dis'])
-
-                # Store vibration data in the HDF5 file
-                vibMeas = testGrp.create_dataset("vibrationMeasurements", data = np.array(vibData), compression="gzip", shuffle=True)
-                vibMeas.attrs['columnNames'] = list(vibData.columns)
-
-                # Store numerical data in the HDF5 file
-                numMeas = testGrp.create_dataset("numericalMeasurements", data = np.array(numData), compression="gzip", shuffle=True)
-                numMeas.attrs['columnNames'] = list(numData.columns)
\ No newline at end of file
+            tests += [(unitNum, testFile) for testFile in sorted(filter(r.match, allUnitsFolder))]
+    return tests
+
+def parse_test_attributes(testName):
+    """Test metadata parsed from the file name."""
+    testTags = testName.replace("[", "").replace("]", "").split("-")
+    return {
+        'type': testTags[0][0],  # Test type (A or B)
+        'angularSpeed': testTags[1],  # Compressor speed
+        'repetition': testTags[2],  # Repetition index
+        'evaporatingTemperature': testTags[4],  # Evaporating temp
+        'condensingTemperature': testTags[5],  # Condensing temp
+    }
+
+def read_csv_array(path, columns):
+    """Parses a ';'-separated numeric CSV into a float64 array with pandas' C parser."""
+    # The files are purely numeric, so latin-1 decodes them exactly like the Windows 'ANSI' code page
+    return pd.read_csv(path, sep=';', decimal='.', header=None, names=columns, dtype=np.float64,
+                       engine='c', encoding='latin-1').to_numpy()
+
+def compress_chunks(data, chunkRows):
+    """
+    gzip+shuffle compressed chunks of a (N, columns) array with chunks of (chunkRows, 1), as HDF5 would
+    store them, so they can be written with write_direct_chunk (the edge chunks are zero padded).
+    """
+    chunks = []
+    for row in range(0, data.shape[0], chunkRows):
+        for column in range(data.shape[1]):
+            chunk = np.zeros(chunkRows, dtype=data.dtype)
+            values = data[row:row + chunkRows, column]
+            chunk[:len(values)] = values
+            # HDF5 shuffle filter: the first bytes of every element, then the second bytes, etc.
+            shuffled = chunk.view(np.uint8).reshape(-1, data.dtype.itemsize).T.tobytes()
+            chunks.append(((row, column), zlib.compress(shuffled, GZIP_LEVEL)))
+    return chunks
+
+def parse_test(dataFolder, unitNum, testFile):
+    """Worker: reads both CSVs of a test and compresses its vibration data."""
+    testName = os.path.splitext(testFile)[0]
+    vibData = read_csv_array(f'{dataFolder}/Vib/{testFile}', VIB_COLUMNS)
+    numData = read_csv_array(f'{dataFolder}/Dat/{testFile}', NUM_COLUMNS)
+    chunkRows = max(1, min(VIB_CHUNK_ROWS, vibData.shape[0]))
+    return {
+        'unit': unitNum,
+        'name': testName,
+        'attrs': parse_test_attributes(testName),
+        'vibShape': vibData.shape,
+        'vibDtype': vibData.dtype,
+        'vibChunkRows': chunkRows,
+        'vibChunks': compress_chunks(vibData, chunkRows),
+        'numData': numData,
+        'numSummary': numerical_summary(numData.T),
+        'vibRms': vibration_rms(vibData.T),
+    }
+
+def write_test(fModel, parsed):
+    """Writer: stores one parsed test in the HDF5 file."""
+    unitGrp = fModel.require_group(parsed['unit'])
+    testGrp = unitGrp.create_group(parsed['name'])
+    for key, value in parsed['attrs'].items():
+        testGrp.attrs[key] = value
+
+    # Vibration data (x, y, z axes), already compressed by the worker
+    vibMeas = testGrp.create_dataset("vibrationMeasurements", shape=parsed['vibShape'], dtype=parsed['vibDtype'],
+                                     chunks=(parsed['vibChunkRows'], 1), compression="gzip",
+                                     compression_opts=GZIP_LEVEL, shuffle=True)
+    for offset, chunk in parsed['vibChunks']:
+        vibMeas.id.write_direct_chunk(offset, chunk)
+    vibMeas.attrs['columnNames'] = VIB_COLUMNS
+
+    # Numerical measurements (temperatures, pressures, etc.)
+    numMeas = testGrp.create_dataset("numericalMeasurements", data=parsed['numData'], compression="gzip", shuffle=True)
+    numMeas.attrs['columnNames'] = NUM_COLUMNS
+    write_summary_attrs(numMeas, parsed['numSummary'], vibMeas, parsed['vibRms'])
+
+def convert(dataFolder, outputPath, workers=None, incremental=False):
+    tests = find_tests(dataFolder)
+    with h5py.File(outputPath, "a" if incremental else "w") as fModel:
+        if incremental:
+            tests = [(unitNum, testFile) for unitNum, testFile in tests
+                     if f'{unitNum}/{os.path.splitext(testFile)[0]}' not in fModel]
+        # Keep a bounded number of parsed tests in flight so memory doesn't grow with the campaign size
+        with ProcessPoolExecutor(max_workers=workers) as executor, tqdm.tqdm(total=len(tests), desc="Teste") as bar:
+            maxPending = 2 * (workers or os.cpu_count() or 1)
+            remaining = iter(tests)
+            pending = set()
+            while True:
+                for unitNum, testFile in remaining:
+                    pending.add(executor.submit(parse_test, dataFolder, unitNum, testFile))
+                    if len(pending) >= maxPending:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write_test(fModel, future.result())
+                    bar.update()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the raw CSV files into the HDF5 dataset.')
+    parser.add_argument('--data-folder', required=True, help="Folder with the 'Dat' and 'Vib' CSV subfolders")
+    parser.add_argument('--output', default=None, help='HDF5 file to write (default: <data-folder>/dataset3.hdf5)')
+    parser.add_argument('--workers', type=int, default=None, help='Number of parsing processes (default: all CPUs)')
+    parser.add_argument('--incremental', action='store_true', help='Only convert tests missing from an existing output')
+    args = parser.parse_args()
+
+    convert(args.data_folder, args.output or f"{args.data_folder}/dataset3.hdf5", args.workers, args.incremental)
@@ -7,7 +7,10 @@
 # processing method, applies it to the filtered dataset, and saves the output.
 #
 # Usage (from command line):
-#   python process_dataset.py --method <ProcessingClass> --config <ConfigName> --slice <SliceName>
+#   python process_dataset.py --method <ProcessingClass> --config <ConfigName> --slice <SliceName> [--workers N] [--format h5|npy|pkl] [--resume]
+#                              [--cache-dir DIR] [--cache-size GB] [--read-ahead K] [--prefetch-mb MB]
+#                              [--profile report.json|report.csv [--profiler cprofile|pyinstrument]] [--shard i/N]
+#   python process_dataset.py --method <ProcessingClass> --sweep <ConfigName> <ConfigName> ... --slice <SliceName> [...]
 #
 # Example:
 #   python process_dataset.py --method bandas_fft --config fft_10x_stdVib --slice low
@@ -15,112 +18,248 @@
 # Arguments:
 #   --method   Name of the processing class to use (e.g., bandas_fft, raw_fft, etc.)
 #   --config   Name of the processing configuration in configs/processing_configs.json
+#   --sweep    Several configurations (same num_slices and precision) computed in one pass: every test is read
+#              once and e.g. bandas_fft reuses one FFT for all the band layouts. One output per configuration.
 #   --slice    Name of the dataset slice to process (e.g., low, high, etc.)
+#   --workers  Number of worker processes (default 1 = serial). Output is identical to the serial run.
+#   --format   Output format: h5 (default, streamed as tests finish), npy (streamed memory-mappable .npy
+#              columns) or pkl (single in-memory DataFrame)
+#   --resume   Skip the tests already written by an interrupted h5/npy run with the same method/config/slice
+#              (tracked in <output>.manifest.json; a changed config entry starts the run over)
+#   --cache-dir  Directory of the per-test feature cache shared by all runs (disabled by default)
+#   --cache-size Maximum size of the feature cache in GB (least recently used entries are evicted)
+#   --read-ahead Tests read and decompressed ahead on a background thread in serial runs (default 2, 0 = off)
+#   --prefetch-mb Cap on the read-ahead data held in memory, in MB (default 1024)
+#   --profile  Write per-stage timings, bytes read and RSS growth, tests, slices/s and peak RSS to a JSON (or .csv) report
+#   --profiler Also save a cProfile (<report>.prof) or pyinstrument (<report>.html) profile of the run
+#   --shard    Process only shard i (0..N-1) of the slice's tests, chosen by a stable hash of the test group path,
+#              into <slice>.shard-i-of-N.h5 (or npy store); combine the N shards with src/utils/merge_shards.py
 #
 # Output:
-#   Saves a .pkl file with the processed DataFrame in processed_datasets/<method>/<slice>.pkl
+#   h5:  streams the features to processed_datasets/<method>/<slice>.h5 (read with src.core.feature_store.read_features)
+#   npy: streams the features to processed_datasets/<method>/<slice>/<column>.npy + store.json (open with src.core.npy_store.FeatureStore)
+#   pkl: saves the processed DataFrame in processed_datasets/<method>/<slice>.pkl
+#   With --sweep, the output of every configuration goes to processed_datasets/<method>/<config>/ instead
 # =============================================================================
 
-import numpy as np
-import pandas as pd
 import json
-import sys
-import tensorflow as tf
 import socket
 import argparse
-import importlib
 import os
+from contextlib import nullcontext, ExitStack
 
 # Import project-specific utilities and database access
 from src.core.dataset_utils import get_filter_attributes
 from src.core.database import VSS_File
+from src.core.feature_store import FeatureWriter
+from src.core.npy_store import NpyFeatureWriter
+from src.core.run_manifest import RunManifest
+from src.core.feature_cache import FeatureCache
+from src.core.sharding import parse_shard, select_shard, shard_suffix
+from src.processing.registry import get_processing_class, available_processing_classes
+
+# Incremental output formats: writer class for each --format
+WRITERS = {'h5': FeatureWriter, 'npy': NpyFeatureWriter}
 
 
 # ----------------------
 # Argument Parsing
 # ----------------------
 parser = argparse.ArgumentParser(description='Process the selected dataset slice.')
-parser.add_argument('--method', help='Processing method class to use')
+parser.add_argument('--method', help=f'Processing method class to use ({", ".join(available_processing_classes())})')
 parser.add_argument('--config', default='no_configs', help='Processing configuration to use')
+parser.add_argument('--sweep', nargs='+', default=None, metavar='CONFIG', help='Process several configurations in one pass (one output each).')
 parser.add_argument('--slice', type=str, default='low', help='The dataset slice to process.')
+parser.add_argument('--workers', type=int, default=1, help='Number of worker processes (1 = serial).')
+parser.add_argument('--format', choices=['h5', 'npy', 'pkl'], default='h5', help='Output format (h5 and npy are written incrementally).')
+parser.add_argument('--resume', action='store_true', help='Resume an interrupted h5/npy run, skipping tests already written.')
+parser.add_argument('--cache-dir', default=None, help='Per-test feature cache directory (disabled if not given).')
+parser.add_argument('--cache-size', type=float, default=20, help='Maximum feature cache size in GB.')
+parser.add_argument('--read-ahead', type=int, default=2, help='Tests read ahead on a background thread (0 = off).')
+parser.add_argument('--prefetch-mb', type=float, default=1024, help='Maximum read-ahead data held in memory, in MB.')
+parser.add_argument('--profile', default=None, help='Write a per-stage profiling report to this JSON or CSV file.')
+parser.add_argument('--shard', default=None, help='Process only shard i/N of the tests (i = 0..N-1), for a later merge.')
+parser.add_argument('--profiler', choices=['cprofile', 'pyinstrument'], default=None, help='Also dump a full profile next to the report.')
 # parser.add_argument('--device', type=str, default='gpu:0', help='CUDA device to use.')
-args = parser.parse_args()
 
 
 
-# ----------------------
-# Dynamically import the selected processing class
-# ----------------------
-def get_processing_class(class_name):
-    """Dynamically import and return the processing class by name."""
-    try:
-        module = importlib.import_module('src.processing.processing_classes')
-        return getattr(module, class_name)
-    except (ImportError, AttributeError) as e:
-        raise Exception(f'Error loading processing class: {class_name}. Details: {e}')
+# Everything below runs only when executed as a script: worker processes re-import this module
+# and must not parse arguments or start processing themselves.
+def main():
+    args = parser.parse_args()
+    if not args.profile:
+        return run(args)
+    # Stage timers are only installed with --profile, so normal runs execute the original methods
+    from src.core.profiling import Profiler
+    with Profiler(dump=args.profiler) as profiler:
+        run(args, profiler)
+    report = profiler.save(args.profile)
+    print(f"Profile saved to: {args.profile} ({report['tests']} tests, {report['slices/s'] or 0:.1f} slices/s)")
 
-if args.method:
-    ProcessingClass = get_processing_class(args.method)
-    print(f'Using class {args.method}')
-else:
-    raise Exception('No processing class provided.')
 
+def run(args, profiler=None):
+    if args.resume and args.format not in WRITERS:
+        raise Exception('--resume is only supported with --format h5 or npy')
+    if args.resume and args.sweep:
+        raise Exception('--resume is not supported with --sweep')
+    if args.shard and args.format not in WRITERS:
+        raise Exception('--shard is only supported with --format h5 or npy')
+    shard = parse_shard(args.shard) if args.shard else None
 
+    # The processing class (and the heavy dependencies it needs) is only imported once selected
+    if args.method:
+        ProcessingClass = get_processing_class(args.method)
+        print(f'Using class {args.method}')
+        if profiler is not None:
+            profiler.instrument(ProcessingClass)
+    else:
+        raise Exception('No processing class provided.')
 
-# ----------------------
-# Load processing configuration parameters
-# ----------------------
-with open('./configs/processing_configs.json') as f:
-    processing_config = json.load(f)
 
-if args.config in processing_config:
-    params = processing_config[args.config]
-    print(f'Loaded params: {params}')
-else:
-    raise Exception(f'Unknown processing configuration: {args.config}')
 
+    # ----------------------
+    # Load processing configuration parameters
+    # ----------------------
+    with open('./configs/processing_configs.json') as f:
+        processing_config = json.load(f)
 
+    for config_name in args.sweep or [args.config]:
+        if config_name not in processing_config:
+            raise Exception(f'Unknown processing configuration: {config_name}')
+    if not args.sweep:
+        params = processing_config[args.config]
+        print(f'Loaded params: {params}')
 
 
-# ----------------------
-# Identify machine and set dataset path
-# ----------------------
-hostname = socket.gethostname()
-print(f'Host: {hostname}')
 
-with open('./configs/dataset_location.json') as f:
-    config = json.load(f)
-if hostname in config:
-    datasetPath = config[hostname]
-else:
-    raise Exception(f'Unknown hostname: {hostname}')
 
+    # ----------------------
+    # Identify machine and set dataset path
+    # ----------------------
+    hostname = socket.gethostname()
+    print(f'Host: {hostname}')
 
+    with open('./configs/dataset_location.json') as f:
+        config = json.load(f)
+    if hostname in config:
+        datasetPath = config[hostname]
+    else:
+        raise Exception(f'Unknown hostname: {hostname}')
 
-# ----------------------
-# Load dataset and process
-# ----------------------
-print(f'Loading dataset HDF5, slice: {args.slice}\n')
-dataset = VSS_File(datasetPath)
 
-# Filter the dataset according to the selected slice
-filtered_list = dataset.DataframeAsList(get_filter_attributes(args.slice))
 
-# Instantiate the processing class with the filtered data and options
-processing_class = ProcessingClass(
-    dataset_slice=args.slice,
-    dataset_list=filtered_list,
-    opts=params
-)
+    # ----------------------
+    # Load dataset and process
+    # ----------------------
+    print(f'Loading dataset HDF5, slice: {args.slice}\n')
+    dataset = VSS_File(datasetPath)
 
-# Run the processing and obtain the resulting DataFrame
-df = processing_class.process()
+    # Filter the dataset according to the selected slice
+    filtered_list = dataset.DataframeAsList(get_filter_attributes(args.slice))
 
-# ----------------------
-# Export the processed DataFrame to a pickle file
-# ----------------------
-output_path = f'./processed_datasets/{processing_class.name}/{args.slice}.pkl'
-output_dir = os.path.dirname(output_path)
-os.makedirs(output_dir, exist_ok=True)
-df.to_pickle(output_path)
-print(f'Processed data saved to: {output_path}')
\ No newline at end of file
+    # With --shard only the tests hashed to this shard are processed, into a partial output named after it.
+    # Its manifest records the tests of the whole slice, in order, for merge_shards.py.
+    output_name, manifest_opts = args.slice, {}
+    if shard is not None:
+        manifest_opts = dict(shard=shard, slice_tests=[test.name for test in filtered_list])
+        output_name = args.slice + shard_suffix(*shard)
+        filtered_list = select_shard(filtered_list, *shard)
+        print(f'Shard {shard[0]}/{shard[1]}: {len(filtered_list)} of {len(manifest_opts["slice_tests"])} tests')
+
+    # Features of tests already processed with the same class/opts (e.g. by another slice) are reused
+    cache = FeatureCache(args.cache_dir, max_bytes=int(args.cache_size * 1024 ** 3)) if args.cache_dir else None
+    prefetch = dict(read_ahead=args.read_ahead, prefetch_bytes=int(args.prefetch_mb * 1024 ** 2))
+
+    if args.sweep:
+        return run_sweep(args, ProcessingClass, processing_config, filtered_list, cache, prefetch, output_name, manifest_opts, profiler)
+
+    # Instantiate the processing class with the filtered data and options
+    processing_class = ProcessingClass(
+        dataset_slice=args.slice,
+        dataset_list=filtered_list,
+        opts=params
+    )
+
+    output_dir = f'./processed_datasets/{processing_class.name}'
+    os.makedirs(output_dir, exist_ok=True)
+
+    # ----------------------
+    # Run the processing, streaming the rows of each test to the h5/npy output.
+    # The manifest records the finished tests so an interrupted run can be resumed.
+    # ----------------------
+    if args.format in WRITERS:
+        Writer = WRITERS[args.format]
+        output_path = f'{output_dir}/{output_name}.h5' if args.format == 'h5' else f'{output_dir}/{output_name}'
+        manifest_path = f'{output_path}.manifest.json'
+        manifest = None
+        if args.resume and os.path.exists(output_path):
+            manifest = RunManifest.load(manifest_path, args.method, args.config, args.slice, params, shard=shard)
+        if manifest is not None:
+            # A test may have been flushed after the last manifest update: it is dropped and recomputed
+            writer = Writer.reopen(output_path, len(manifest.completed), manifest)
+            if writer.test_names() != manifest.completed:
+                raise Exception(f'{output_path} does not match its manifest, run again without --resume')
+            done = set(manifest.completed)
+            processing_class.dataset_list = [test for test in filtered_list if test.name not in done]
+            print(f'Resuming: {len(done)} of {len(filtered_list)} tests already written')
+        else:
+            if args.resume:
+                print('No manifest matching this method/config/slice, starting from scratch')
+            manifest = RunManifest(manifest_path, args.method, args.config, args.slice, params, total_tests=len(filtered_list),
+                                   **manifest_opts)
+            manifest.save()
+            writer = Writer(output_path, manifest=manifest)
+        with writer:
+            processing_class.process(workers=args.workers, writer=writer, cache=cache, **prefetch)
+        print(f'Processed data saved to: {output_path}')
+        return
+
+    # ----------------------
+    # Or obtain the whole DataFrame and export it to a pickle file
+    # ----------------------
+    df = processing_class.process(workers=args.workers, cache=cache, **prefetch)
+    output_path = f'{output_dir}/{args.slice}.pkl'
+    with profiler.stage('to_pickle') if profiler is not None else nullcontext():
+        df.to_pickle(output_path)
+    print(f'Processed data saved to: {output_path}')
+
+
+def run_sweep(args, ProcessingClass, processing_config, filtered_list, cache, prefetch, output_name, manifest_opts, profiler=None):
+    """Processes every configuration of --sweep in one pass, writing one output per configuration."""
+    from src.processing.processing_classes import ConfigSweep
+    params_list = [processing_config[config_name] for config_name in args.sweep]
+    for config_name, params in zip(args.sweep, params_list):
+        print(f'Loaded params ({config_name}): {params}')
+    sweep = ConfigSweep(ProcessingClass, args.slice, filtered_list, params_list)
+
+    output_dirs = [f'./processed_datasets/{sweep.name}/{config_name}' for config_name in args.sweep]
+    for output_dir in output_dirs:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if args.format in WRITERS:
+        Writer = WRITERS[args.format]
+        output_paths = [f'{output_dir}/{output_name}.h5' if args.format == 'h5' else f'{output_dir}/{output_name}'
+                        for output_dir in output_dirs]
+        with ExitStack() as stack:
+            writers = []
+            for output_path, config_name, params in zip(output_paths, args.sweep, params_list):
+                manifest = RunManifest(f'{output_path}.manifest.json', args.method, config_name, args.slice, params,
+                                       total_tests=len(filtered_list), **manifest_opts)
+                manifest.save()
+                writers.append(stack.enter_context(Writer(output_path, manifest=manifest)))
+            sweep.process(workers=args.workers, writers=writers, cache=cache, **prefetch)
+        for output_path in output_paths:
+            print(f'Processed data saved to: {output_path}')
+        return
+
+    dataframes = sweep.process(workers=args.workers, cache=cache, **prefetch)
+    for output_dir, df in zip(output_dirs, dataframes):
+        output_path = f'{output_dir}/{args.slice}.pkl'
+        with profiler.stage('to_pickle') if profiler is not None else nullcontext():
+            df.to_pickle(output_path)
+        print(f'Processed data saved to: {output_path}')
+
+
+if __name__ == '__main__':
+    main()
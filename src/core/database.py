@@ -1,7 +1,18 @@
+import os
 import h5py
-import pandas as pd
+import threading
 import numpy as np
 from contextlib import contextmanager
+try:
+    import hdf5plugin  # registers the Blosc/LZ4 filters used by repacked datasets (optional)
+except ImportError:
+    hdf5plugin = None
+
+from .metadata_index import load_metadata_index, filter_index
+from .test_summary import NUMERICAL_COLUMNS
+
+# Sampling rate of the vibration recordings (used when a dataset has no samplingRate attribute)
+VIBRATION_FS = 51200
 
 @contextmanager
 def open_hdf5_file(filePath):
@@ -11,56 +22,151 @@ def open_hdf5_file(filePath):
     finally:
         file.close()
 
+class HandlePool:
+    """
+    Read-only h5py handles of one file: one per thread (up to max_handles, after which the extra threads
+    share the first handle of their process) and per process, so a forked child never reuses the parent's.
+    Handles of threads that have exited are closed when the pool is full. h5py serializes the calls into
+    the HDF5 library, so sharing a handle is safe too; separate handles keep threads from sharing file state.
+    """
+    def __init__(self, path, max_handles=8):
+        self.path = path
+        self.max_handles = max_handles
+        self._handles = {}  # (pid, thread id) -> h5py.File
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def get(self):
+        """The handle of the calling thread, opened on first use."""
+        key = (os.getpid(), threading.get_ident())
+        handle = self._handles.get(key)
+        if handle is not None:
+            return handle
+        with self._lock:
+            if self._closed:
+                raise ValueError(f'{self.path} has been closed')
+            handles = [k for k in self._handles if k[0] == key[0]]
+            if len(handles) >= self.max_handles:
+                alive = {thread.ident for thread in threading.enumerate()}
+                for k in handles[1:]:
+                    if k[1] not in alive:
+                        self._handles.pop(k).close()
+                handles = [k for k in self._handles if k[0] == key[0]]
+            if len(handles) >= self.max_handles:
+                return self._handles[handles[0]]
+            handle = self._handles[key] = h5py.File(self.path, 'r')
+            return handle
+
+    def close(self):
+        """Closes the handles opened by this process (those inherited from a parent process are left alone)."""
+        with self._lock:
+            self._closed = True
+            for key in [k for k in self._handles if k[0] == os.getpid()]:
+                self._handles.pop(key).close()
+
+
 class VSS_File:
-    """Class for vibration-based soft sensing database in an hdf5 file"""
-    def __init__(self, filePath):
+    """
+    Class for vibration-based soft sensing database in an hdf5 file.
+    Unit and test references are created lazily; with useIndex the test metadata is read from a
+    cached columnar index (see metadata_index.py) so DataframeAsList doesn't walk every group.
+    References only hold group names: every access goes through the h5py handle of the calling thread
+    (see HandlePool), so the same references can be read from several threads. Use it as a context
+    manager, or call close(), to close the file.
+    """
+    def __init__(self, filePath, useIndex=True, maxHandles=8):
         self.path = filePath
-        self._index = 0
-        self._fileh5ref = h5py.File(filePath,'r')
-        self.units =  [self.VSS_Unit_Reference(self,self._fileh5ref[group]) for group in self._fileh5ref.keys()]
+        self._pool = HandlePool(filePath, maxHandles)
+        self._units = None
+        self._unitReferences = {}
+        self.metadataIndex = load_metadata_index(filePath, self._fileh5ref) if useIndex else None
+
+    @property
+    def _fileh5ref(self):
+        return self._pool.get()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._pool.close()
+
+    @property
+    def units(self):
+        if self._units is None:
+            self._units = [self._unitReference(self._fileh5ref[group].name) for group in self._fileh5ref.keys()]
+        return self._units
 
     def __repr__(self):
-        return f"Vibration-based database for ({len(self.units)} units)"
+        return f"Vibration-based database for ({len(self._fileh5ref.keys())} units)"
 
     def __iter__(self):
-        return self
-    
-    def __next__(self):
-        if self._index == len(self.units):
-            self._index = 0
-            raise StopIteration
-        else:
-            self._index += 1
-            return self.units[self._index-1]
-    
+        # A new iterator every time, so nested or concurrent loops don't interfere
+        return iter(self.units)
+
     def DataframeAsList(self, attributeDict, selectedUnits = None):
+        if self.metadataIndex is not None:
+            if selectedUnits is not None:
+                selectedUnits = [self._fileh5ref[group].name for group in selectedUnits]
+            # Tests without summary attrs only read their numerical data if a numerical column is filtered on
+            numericalMean = lambda testName, column: self.returnTestReference(testName).returnNumericalMean(column)
+            mask = filter_index(self.metadataIndex, attributeDict, selectedUnits, numericalMean)
+            testNames = self.metadataIndex['test'][mask]
+            if selectedUnits is not None:
+                # Same order as without the index: the units in the order given, their tests in file order
+                units = self.metadataIndex['unit'][mask]
+                testNames = [testName for unit in selectedUnits for testName in testNames[units == unit]]
+            return [self.returnTestReference(testName) for testName in testNames]
         if selectedUnits is None:
             selectedUnits = self.units
         else:
-            selectedUnits = [self.VSS_Unit_Reference(self,self._fileh5ref[group]) for group in selectedUnits]
+            selectedUnits = [self._unitReference(self._fileh5ref[group].name) for group in selectedUnits]
         return [item for unit in selectedUnits for item in unit.filterTestsByAttributeDict(attributeDict)]
 
+    def returnTestReference(self, testName):
+        """Returns the test reference for a test group path such as '/1/A1-...'."""
+        testGroup = self._fileh5ref[str(testName)]
+        return self._unitReference(testGroup.parent.name)._testReference(testGroup.name)
+
+    def _unitReference(self, unitName):
+        unit = self._unitReferences.get(unitName)
+        if unit is None:
+            # setdefault keeps a single reference per group if two threads create it at the same time
+            unit = self._unitReferences.setdefault(unitName, self.VSS_Unit_Reference(self, self._fileh5ref[unitName]))
+        return unit
+
     class VSS_Unit_Reference:
         def __init__(self, parent, unitGroupId:h5py.Group):
-            self._h5ref = unitGroupId
             self._h5file = parent
             self.name = unitGroupId.name
-            self._index = 0
-            self.tests = [self.VSS_Test_Reference(self,self._h5ref[group]) for group in self._h5ref.keys()]
+            self._tests = None
+            self._testReferences = {}
+
+        @property
+        def _h5ref(self):
+            return self._h5file._fileh5ref[self.name]
+
+        @property
+        def tests(self):
+            if self._tests is None:
+                self._tests = [self._testReference(self._h5ref[group].name) for group in self._h5ref.keys()]
+            return self._tests
+
+        def _testReference(self, testName):
+            test = self._testReferences.get(testName)
+            if test is None:
+                test = self._testReferences.setdefault(testName, self.VSS_Test_Reference(self, self._h5ref[testName]))
+            return test
 
         def __repr__(self):
             return f"Vibration-based database for unit <{self.name}> ({len(self.tests)} tests)"
         def __str__(self):
             return self.name
         def __iter__(self):
-            return self
-        def __next__(self):
-            if self._index == len(self.tests):
-                self._index = 0
-                raise StopIteration
-            else:
-                self._index += 1
-                return self.tests[self._index-1]
+            return iter(self.tests)
         def filterTestsByAttributeDict(self, attributeDict):
             output = [test for test in self.tests]
             if "angularSpeed" in attributeDict.keys():
@@ -71,16 +177,21 @@ class VSS_File:
                 output = [test for test in output if min(attributeDict['evaporatingTemperature']) <= float(test._h5ref.attrs['evaporatingTemperature'].replace(',','.')) <= max(attributeDict['evaporatingTemperature'])]
             if "compressor" in attributeDict.keys():
                 output = [test for test in output if int(str(test.name)[1]) in attributeDict['compressor']]
+            for column in NUMERICAL_COLUMNS:
+                if column in attributeDict.keys():
+                    output = [test for test in output if min(attributeDict[column]) <= test.returnNumericalMean(column) <= max(attributeDict[column])]
             return output
 
         class VSS_Test_Reference:
             def __init__(self, parent, testGroupId:h5py.Group):
-                self._h5ref = testGroupId
                 self._h5file = parent._h5file
                 self.h5unit = parent
                 self.date = testGroupId.name
                 self.unit = parent.name
                 self.name = testGroupId.name
+            @property
+            def _h5ref(self):
+                return self._h5file._fileh5ref[self.name]
             def __repr__(self):
                 return f"Vibration soft sensing test database <{self.name}>"
             def __str__(self):
@@ -90,12 +201,17 @@ class VSS_File:
             def returnNumericalHeaders(self):
                 return list(self._h5ref["numericalMeasurements"].attrs["columnNames"])
             def returnNumericalDataframe(self):
+                import pandas as pd  # only needed by the DataFrame accessors, not by the processing path
                 return pd.DataFrame(data = self.returnNumericalDatabase(), columns = self.returnNumericalHeaders())
             def returnVibrationDatabase(self):
-                return np.array(self._h5ref["vibrationMeasurements"])
+                dataset = self._h5ref["vibrationMeasurements"]
+                if self._isAxisMajor(dataset):
+                    return np.array(dataset).T
+                return np.array(dataset)
             def returnVibrationHeaders(self):
                 return list(self._h5ref["vibrationMeasurements"].attrs["columnNames"])
             def returnVibrationDataframe(self):
+                import pandas as pd
                 return pd.DataFrame(data = self.returnVibrationDatabase(), columns = self.returnVibrationHeaders())
             def returnAttributeList(self):
                 return list(self._h5ref.attrs)
@@ -105,21 +221,116 @@ class VSS_File:
                 for element in AttributeList:
                     AttributeDict[element] = self._h5ref.attrs[element]
                 return AttributeDict
+            def returnNumericalArray(self, columns=None, dtype=None):
+                """Reads numericalMeasurements once (no DataFrame) and returns one contiguous row per column."""
+                return self._readColumns(self._h5ref["numericalMeasurements"], columns, dtype)
+            def returnVibrationArray(self, axes=None, dtype=None):
+                """Reads vibrationMeasurements once (no DataFrame) and returns a contiguous (len(axes), N) array."""
+                return self._readColumns(self._h5ref["vibrationMeasurements"], axes, dtype)
+            def splitVibrationBlock(self, n, axes=("x", "y", "z"), dtype=None):
+                """
+                Reads vibrationMeasurements once and returns a contiguous (n, len(axes), samples) block,
+                i.e. the n slices of every axis (the samples that don't fill a whole slice are dropped).
+                """
+                dataset = self._h5ref["vibrationMeasurements"]
+                if self._isAxisMajor(dataset):
+                    data = self._readColumns(dataset, axes, dtype)
+                    size = data.shape[1] - data.shape[1] % n
+                    return np.ascontiguousarray(data[:, :size].reshape(len(data), n, -1).transpose(1, 0, 2))
+                columns = self._columnIndices(dataset, axes)
+                buffer = self._readDirect(dataset, dtype)
+                size = buffer.shape[0] - buffer.shape[0] % n
+                return np.ascontiguousarray(buffer[:size].reshape(n, -1, buffer.shape[1]).transpose(0, 2, 1)[:, columns])
+            def returnNumericalSummary(self, stat="mean", columns=None):
+                """Stored statistic (mean, std, min or max) of every requested numerical column, or None if the file has no summary."""
+                return self._readSummary(self._h5ref["numericalMeasurements"], stat, columns)
+            def returnVibrationRMS(self, axes=None):
+                """Stored RMS of every requested axis, or None if the file has no summary."""
+                return self._readSummary(self._h5ref["vibrationMeasurements"], "rms", axes)
+            def returnNumericalMean(self, column):
+                # From the stored summary when there is one, otherwise from the data
+                means = self.returnNumericalSummary("mean", [column])
+                if means is None:
+                    means = np.nanmean(self.returnNumericalArray([column]), axis=1)
+                return means[0]
+            def _readSummary(self, dataset, stat, columns=None):
+                if stat not in dataset.attrs:
+                    return None
+                return np.asarray(dataset.attrs[stat])[self._columnIndices(dataset, columns)]
+            def returnVibrationWindow(self, start_s, stop_s, axes=("x", "y", "z"), dtype=None):
+                """
+                Vibration samples between start_s and stop_s seconds as a contiguous (len(axes), samples) array.
+                Only the chunks covering that range are decompressed (see returnVibrationSamples).
+                """
+                Fs = self.returnSamplingRate()
+                return self.returnVibrationSamples(int(round(start_s * Fs)), int(round(stop_s * Fs)), axes, dtype)
+            def returnVibrationSamples(self, start, stop, axes=("x", "y", "z"), dtype=None):
+                """Samples start:stop (clipped to the recording) of the given axes, read with a hyperslab selection."""
+                dataset = self._h5ref["vibrationMeasurements"]
+                return self._readWindow(dataset, self._columnIndices(dataset, axes), start, stop, dtype)
+            def returnVibrationSlice(self, k, n, axes=("x", "y", "z"), dtype=None):
+                """Slice k of n as a (len(axes), samples) array, equal to splitVibrationBlock(n, axes)[k] without reading the rest."""
+                if not 0 <= k < n:
+                    raise IndexError(f"Slice {k} out of range for {n} slices")
+                length = self._numSamples(self._h5ref["vibrationMeasurements"]) // n
+                return self.returnVibrationSamples(k * length, (k + 1) * length, axes, dtype)
+            def returnSamplingRate(self):
+                # Recordings are sampled at 51.2 kHz unless the dataset says otherwise
+                return float(self._h5ref["vibrationMeasurements"].attrs.get("samplingRate", VIBRATION_FS))
+            def _numSamples(self, dataset):
+                return dataset.shape[1] if self._isAxisMajor(dataset) else dataset.shape[0]
+            def _readWindow(self, dataset, indices, start, stop, dtype=None):
+                # (len(indices), stop - start) array read column by column straight from the selected hyperslab
+                numSamples = self._numSamples(dataset)
+                start, stop = max(0, start), min(stop, numSamples)
+                out = np.empty((len(indices), max(0, stop - start)), dtype=dataset.dtype if dtype is None else dtype)
+                if out.size:
+                    for row, index in enumerate(indices):
+                        source = np.s_[index, start:stop] if self._isAxisMajor(dataset) else np.s_[start:stop, index]
+                        dataset.read_direct(out, source, np.s_[row])
+                return out
+            def _isAxisMajor(self, dataset):
+                # Datasets rewritten by utils/repack_dataset.py are stored transposed, as (columns, N)
+                return dataset.attrs.get("layout") == "axis-major"
+            def _readColumns(self, dataset, columns=None, dtype=None):
+                # Contiguous (len(columns), N) array of the requested columns, decompressing the dataset once
+                indices = self._columnIndices(dataset, columns)
+                if not self._isAxisMajor(dataset):
+                    return np.ascontiguousarray(self._readDirect(dataset, dtype).T[indices])
+                if indices == list(range(dataset.shape[0])):
+                    return self._readDirect(dataset, dtype)
+                # Each axis has its own chunks: only the requested ones are decompressed
+                out = np.empty((len(indices), dataset.shape[1]), dtype=dataset.dtype if dtype is None else dtype)
+                if out.size:
+                    for row, index in enumerate(indices):
+                        dataset.read_direct(out, np.s_[index], np.s_[row])
+                return out
+            def _readDirect(self, dataset, dtype=None):
+                # Decompresses the dataset straight into a preallocated buffer (converted to dtype by HDF5)
+                buffer = np.empty(dataset.shape, dtype=dataset.dtype if dtype is None else dtype)
+                if buffer.size:
+                    dataset.read_direct(buffer)
+                return buffer
+            def _columnIndices(self, dataset, columns):
+                headers = list(dataset.attrs["columnNames"])
+                if columns is None:
+                    return list(range(len(headers)))
+                for column in columns:
+                    if column not in headers:
+                        raise ValueError(f"Invalid axis: {column}")
+                return [headers.index(column) for column in columns]
             def splitVibrationWaveform(self, n, axis):
-                vibData = np.array(self.returnVibrationDataframe()[axis])
+                vibData = self.returnVibrationArray([axis])[0]
                 if np.size(vibData) % n:
                     return np.split(vibData[0:-(np.size(vibData)%n)],n)
                 else:
                     return np.split(vibData,n)
             def splitVibrationWaveforms(self, n, axes):
-                for axis in axes:
-                    if axis not in self.returnVibrationHeaders():
-                        raise ValueError(f"Invalid axis: {axis}")
-                vibDataList = [self.returnVibrationDataframe()[axis].to_numpy() for axis in axes]
+                vibDataList = self.returnVibrationArray(axes)
                 results = {}
                 for i, vibData in enumerate(vibDataList):
                     size = vibData.size
                     if size % n:
                         vibData = vibData[0:-(size % n)]
                     results[axes[i]] = vibData.reshape(n, -1)
-                return results
+                return results
\ No newline at end of file
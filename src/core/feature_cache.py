@@ -0,0 +1,92 @@
+import os
+import hashlib
+import warnings
+import numpy as np
+
+from .run_manifest import config_hash
+
+def file_identity(filePath):
+    """Identity of an HDF5 dataset file: name, size and modification time (a rewritten file gets a new one)."""
+    stat = os.stat(filePath)
+    return f'{os.path.basename(filePath)}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+class FeatureCache:
+    """
+    On-disk cache of the features of single tests, so slices that share tests (e.g. low and all_comp)
+    don't recompute them. Entries are .npz files of feature columns addressed by a hash of
+    (HDF5 file identity, test group path, processing class, class version, opts). The directory is kept
+    under max_bytes by evicting the least recently used entries (reads refresh an entry's mtime).
+    Several processes can share the same directory: entries are written to a temporary file and renamed.
+    A read-only directory (e.g. a shared cache) still serves hits; new entries are then skipped with a warning.
+    """
+    def __init__(self, directory, max_bytes=20 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._size = None
+        self._writable = True
+
+    def key(self, filePath, test_name, class_name, version, opts):
+        identity = '|'.join([file_identity(filePath), test_name, class_name, str(version), config_hash(opts)])
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def get(self, key):
+        """Returns the cached columns for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                columns = {name: entry[name] for name in entry.files}
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # LRU touch; not possible on a read-only cache, where the hit still counts
+        except OSError:
+            pass
+        return columns
+
+    def put(self, key, columns):
+        """Stores the columns of a test (skipped, with a warning the first time, if the directory isn't writable)."""
+        if not self._writable:
+            return
+        path = self._path(key)
+        tmpPath = f'{path}.{os.getpid()}.tmp.npz'
+        try:
+            np.savez(tmpPath, **columns)
+            size = os.path.getsize(tmpPath)
+            os.replace(tmpPath, path)
+            if self._size is not None:
+                self._size += size
+            if self._size is None or self._size > self.max_bytes:
+                self.evict()
+        except OSError as e:
+            self._writable = False
+            try:
+                os.remove(tmpPath)
+            except OSError:
+                pass
+            warnings.warn(f'Feature cache {self.directory} is not writable, new entries are not cached: {e}')
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz') or name.endswith('.tmp.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
@@ -0,0 +1,142 @@
+import os
+import h5py
+import numpy as np
+
+# Target size of a chunk of each feature column in the HDF5 output
+CHUNK_BYTES = 1024 ** 2
+
+def rows_to_columns(rows):
+    """Stacks a list of row dicts into NumPy columns; array-valued features become (rows, ...) arrays."""
+    return {key: np.stack([np.asarray(row[key]) for row in rows]) for key in rows[0]}
+
+def columns_to_dataframe(columns):
+    """DataFrame in the layout returned by process(): multi-dimensional columns hold one array per row."""
+    import pandas as pd
+    return pd.DataFrame({key: list(values) if values.ndim > 1 else values for key, values in columns.items()})
+
+
+class FeatureWriter:
+    """
+    Streams feature columns to an HDF5 file as tests finish, instead of keeping every row in memory.
+    Each feature is a resizable dataset of shape (rows, ...), so fixed-width vectors (e.g. band energies)
+    are stored as real 2-D arrays. The test that produced each block of rows is recorded in the
+    '_tests'/'_test_end' datasets, which are appended last and mark the rows that are complete.
+    The file is written in SWMR mode, so it stays readable while the run is in progress or after a crash.
+    If a RunManifest is given, every appended test is recorded in it after the rows are flushed.
+    """
+    def __init__(self, path, mode='w', manifest=None):
+        self.path = path
+        self.manifest = manifest
+        self._file = h5py.File(path, mode, libver='latest')
+        if '_test_end' in self._file:
+            self.num_rows = int(self._file['_test_end'][-1]) if len(self._file['_test_end']) else 0
+            self.num_tests = len(self._file['_test_end'])
+            self._file.swmr_mode = True
+        else:
+            self.num_rows = 0
+            self.num_tests = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, columns, test_name=''):
+        """Appends the rows of one test, given as a dict of equally long NumPy columns."""
+        numRows = len(next(iter(columns.values())))
+        if '_test_end' not in self._file:
+            self._create_datasets(columns)
+        for key, values in columns.items():
+            dataset = self._file[key]
+            dataset.resize(self.num_rows + numRows, axis=0)
+            dataset[self.num_rows:] = values
+        self.num_rows += numRows
+        self.num_tests += 1
+        for key, value in (('_tests', test_name), ('_test_end', self.num_rows)):
+            self._file[key].resize(self.num_tests, axis=0)
+            self._file[key][-1] = value
+        self._file.flush()
+        if self.manifest is not None:
+            self.manifest.mark_done(test_name, self.num_rows)
+
+    @classmethod
+    def reopen(cls, path, num_tests, manifest=None):
+        """
+        Reopens an existing output to continue it after its first num_tests tests (anything written
+        after them is dropped). A file whose writer was killed still carries the SWMR "open for write"
+        flags and can only be opened read-only, so its first num_tests tests are copied to a fresh file.
+        """
+        try:
+            writer = cls(path, mode='a', manifest=manifest)
+        except OSError:
+            tmpPath = f'{path}.recover'
+            with cls(tmpPath) as recovered, h5py.File(path, 'r', libver='latest', swmr=True) as old:
+                testEnd = old['_test_end'][:num_tests]
+                testNames = old['_tests'].asstr()[:num_tests]
+                start = 0
+                for testName, end in zip(testNames, testEnd):
+                    recovered.append({key: old[key][start:end] for key in old.attrs['columns']}, testName)
+                    start = end
+            os.replace(tmpPath, path)
+            writer = cls(path, mode='a', manifest=manifest)
+        if writer.num_tests < num_tests:
+            writer.close()
+            raise ValueError(f'{path} has only {writer.num_tests} of {num_tests} tests')
+        writer.truncate(num_tests)
+        return writer
+
+    def test_names(self):
+        """Names of the tests written so far, in order."""
+        return list(self._file['_tests'].asstr()[:]) if '_tests' in self._file else []
+
+    def truncate(self, num_tests):
+        """Drops every test after the first num_tests (e.g. one written after the last manifest update)."""
+        if num_tests >= self.num_tests:
+            return
+        self.num_rows = int(self._file['_test_end'][num_tests - 1]) if num_tests else 0
+        self.num_tests = num_tests
+        for key in self._file.attrs['columns']:
+            self._file[key].resize(self.num_rows, axis=0)
+        for key in ('_tests', '_test_end'):
+            self._file[key].resize(num_tests, axis=0)
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _create_datasets(self, columns):
+        for key, values in columns.items():
+            rowShape = values.shape[1:]
+            chunkRows = max(1, CHUNK_BYTES // max(1, values.dtype.itemsize * int(np.prod(rowShape))))
+            self._file.create_dataset(key, shape=(0,) + rowShape, maxshape=(None,) + rowShape,
+                                      chunks=(chunkRows,) + rowShape, dtype=values.dtype)
+        self._file.create_dataset('_tests', shape=(0,), maxshape=(None,), chunks=(1024,), dtype=h5py.string_dtype())
+        self._file.create_dataset('_test_end', shape=(0,), maxshape=(None,), chunks=(1024,), dtype=np.int64)
+        self._file.attrs['columns'] = list(columns)
+        # No new objects can be created from here on, but the file stays consistent for readers
+        self._file.swmr_mode = True
+
+
+def read_feature_columns(path, columns=None):
+    """Reads the complete rows of a FeatureWriter file as a dict of NumPy columns (only those of columns, if given)."""
+    with h5py.File(path, 'r', libver='latest', swmr=True) as file:
+        if '_test_end' not in file:
+            return {}
+        testEnd = file['_test_end'][:]
+        numRows = int(testEnd[-1]) if len(testEnd) else 0
+        keys = [key for key in file.attrs['columns'] if columns is None or key in columns]
+        return {key: file[key][:numRows] for key in keys}
+
+def read_feature_tests(path):
+    """Returns the (test names, row end offsets) table of a FeatureWriter file."""
+    with h5py.File(path, 'r', libver='latest', swmr=True) as file:
+        if '_test_end' not in file:
+            return [], np.zeros(0, dtype=np.int64)
+        return list(file['_tests'].asstr()[:]), file['_test_end'][:]
+
+def read_features(path):
+    """Reads a FeatureWriter file as a DataFrame with the same layout as process()."""
+    return columns_to_dataframe(read_feature_columns(path))
@@ -0,0 +1,137 @@
+import os
+import hashlib
+import numpy as np
+
+from .test_summary import NUMERICAL_COLUMNS, numerical_means
+
+# Bump when the index layout changes so old cache files are rebuilt
+INDEX_VERSION = 3
+
+# Per-test means of the numerical measurements, e.g. 'mean_p_dis', taken from the summary attrs ('summarized'):
+# tests without them get NaN, so building the index never reads the measurements themselves
+MEAN_COLUMNS = tuple(f'mean_{column}' for column in NUMERICAL_COLUMNS)
+
+INDEX_COLUMNS = (
+    'unit', 'test', 'compressor', 'type', 'repetition', 'angularSpeed',
+    'evaporatingTemperature', 'condensingTemperature',
+    'vibrationRows', 'vibrationColumns', 'numericalRows', 'numericalColumns', 'summarized',
+) + MEAN_COLUMNS
+
+def _file_stamp(filePath):
+    stat = os.stat(filePath)
+    return np.array([INDEX_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+def _index_paths(filePath):
+    """Candidate cache locations: beside the HDF5 file, then the user cache (for read-only shares)."""
+    realPath = os.path.realpath(filePath)
+    digest = hashlib.sha1(realPath.encode()).hexdigest()[:16]
+    userCache = os.path.join(os.path.expanduser('~'), '.cache', 'vss_dataset', f'{digest}.index.npz')
+    return [realPath + '.index.npz', userCache]
+
+def _parse_float(value):
+    try:
+        return float(str(value).replace(',', '.'))
+    except ValueError:
+        return np.nan
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return -1
+
+def build_metadata_index(h5file):
+    """Walks every unit/test group once and returns the test metadata as a dict of NumPy columns."""
+    rows = {column: [] for column in INDEX_COLUMNS}
+    for unitKey in h5file.keys():
+        unitGroup = h5file[unitKey]
+        for testKey in unitGroup.keys():
+            testGroup = unitGroup[testKey]
+            attrs = testGroup.attrs
+            vibDataset = testGroup.get("vibrationMeasurements")
+            vibShape = vibDataset.shape if vibDataset is not None else (0, 0)
+            if vibDataset is not None and vibDataset.attrs.get("layout") == "axis-major":
+                vibShape = vibShape[::-1]  # repacked datasets are stored as (columns, N)
+            numShape = testGroup["numericalMeasurements"].shape if "numericalMeasurements" in testGroup else (0, 0)
+            rows['unit'].append(unitGroup.name)
+            rows['test'].append(testGroup.name)
+            # Same convention as filterTestsByAttributeDict: the compressor is the digit after the leading '/'
+            rows['compressor'].append(_parse_int(testGroup.name[1]))
+            rows['type'].append(str(attrs.get('type', '')))
+            rows['repetition'].append(str(attrs.get('repetition', '')))
+            rows['angularSpeed'].append(_parse_int(attrs.get('angularSpeed', -1)))
+            rows['evaporatingTemperature'].append(_parse_float(attrs.get('evaporatingTemperature', 'nan')))
+            rows['condensingTemperature'].append(_parse_float(attrs.get('condensingTemperature', 'nan')))
+            rows['vibrationRows'].append(vibShape[0])
+            rows['vibrationColumns'].append(vibShape[1] if len(vibShape) > 1 else 1)
+            rows['numericalRows'].append(numShape[0])
+            rows['numericalColumns'].append(numShape[1] if len(numShape) > 1 else 1)
+            means = numerical_means(testGroup)
+            rows['summarized'].append(means is not None)
+            for column, mean in zip(MEAN_COLUMNS, means if means is not None else [np.nan] * len(MEAN_COLUMNS)):
+                rows[column].append(mean)
+    index = {column: np.array(values) for column, values in rows.items()}
+    for column in ('unit', 'test', 'type', 'repetition'):
+        index[column] = index[column].astype(str)
+    for column in ('compressor', 'angularSpeed', 'vibrationRows', 'vibrationColumns', 'numericalRows', 'numericalColumns'):
+        index[column] = index[column].astype(np.int64)
+    for column in ('evaporatingTemperature', 'condensingTemperature') + MEAN_COLUMNS:
+        index[column] = index[column].astype(np.float64)
+    index['summarized'] = index['summarized'].astype(bool)
+    return index
+
+def load_metadata_index(filePath, h5file):
+    """
+    Returns the metadata index of an HDF5 dataset, reading it from the cache when the file's
+    size and mtime still match, or building it from h5file (and caching it) otherwise.
+    """
+    stamp = _file_stamp(filePath)
+    paths = _index_paths(filePath)
+    for path in paths:
+        try:
+            with np.load(path, allow_pickle=False) as cached:
+                if np.array_equal(cached['_stamp'], stamp):
+                    return {column: cached[column] for column in INDEX_COLUMNS}
+        except (OSError, KeyError, ValueError):
+            continue
+    index = build_metadata_index(h5file)
+    for path in paths:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmpPath = f'{path}.{os.getpid()}.tmp.npz'
+            np.savez(tmpPath, _stamp=stamp, **index)
+            os.replace(tmpPath, path)
+            break
+        except OSError:
+            continue
+    return index
+
+def filter_index(index, attributeDict, selectedUnits=None, numerical_mean=None):
+    """
+    Boolean mask of the tests matching attributeDict (same rules as filterTestsByAttributeDict).
+    numerical_mean(test, column) gives the mean of the tests without summary attrs that are still selected
+    when a numerical column is filtered on (otherwise their NaN mean never matches).
+    """
+    mask = np.ones(len(index['test']), dtype=bool)
+    if selectedUnits is not None:
+        mask &= np.isin(index['unit'], list(selectedUnits))
+    if "angularSpeed" in attributeDict.keys():
+        mask &= np.isin(index['angularSpeed'], attributeDict['angularSpeed'])
+    if "condensingTemperature" in attributeDict.keys():
+        values = index['condensingTemperature']
+        mask &= (min(attributeDict['condensingTemperature']) <= values) & (values <= max(attributeDict['condensingTemperature']))
+    if "evaporatingTemperature" in attributeDict.keys():
+        values = index['evaporatingTemperature']
+        mask &= (min(attributeDict['evaporatingTemperature']) <= values) & (values <= max(attributeDict['evaporatingTemperature']))
+    if "compressor" in attributeDict.keys():
+        mask &= np.isin(index['compressor'], attributeDict['compressor'])
+    # Numerical columns (e.g. "p_dis": [min, max]) select tests by the range of their mean value
+    for column in NUMERICAL_COLUMNS:
+        if column in attributeDict.keys():
+            values = index[f'mean_{column}']
+            missing = np.flatnonzero(mask & ~index['summarized'])
+            if numerical_mean is not None and len(missing):
+                values = values.copy()
+                values[missing] = [numerical_mean(test, column) for test in index['test'][missing]]
+            mask &= (min(attributeDict[column]) <= values) & (values <= max(attributeDict[column]))
+    return mask
@@ -0,0 +1,186 @@
+import os
+import json
+import numpy as np
+
+# Every column file starts with a fixed-size .npy header, rewritten in place as rows are appended
+NPY_HEADER_BYTES = 256
+STORE_VERSION = 1
+
+def npy_header(dtype, shape):
+    """A version 1.0 .npy header for a C-ordered array, padded to exactly NPY_HEADER_BYTES."""
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': tuple(shape)})
+    padding = NPY_HEADER_BYTES - 10 - len(header) - 1
+    if padding < 0:
+        raise ValueError(f'.npy header too long for {dtype} {shape}')
+    header = header + ' ' * padding + '\n'
+    return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+class NpyFeatureWriter:
+    """
+    Streams feature columns to a directory of .npy files (one per column, shape (rows, ...)) plus a
+    store.json table with the column dtypes/shapes and the test that produced each block of rows.
+    Unlike the pickled DataFrame, every column is a contiguous fixed-shape array that can be memory-mapped
+    (see FeatureStore), so training loaders gather rows without unpickling or stacking anything.
+    Same interface as feature_store.FeatureWriter: store.json is rewritten atomically after each test and
+    is what marks rows as complete, so a run that was killed can be resumed with reopen().
+    """
+    def __init__(self, path, mode='w', manifest=None):
+        self.path = path
+        self.manifest = manifest
+        self._files = {}
+        if mode == 'a' and os.path.exists(os.path.join(path, 'store.json')):
+            meta = _read_meta(path)
+            self._columns = meta['columns']
+            self._tests = meta['tests']
+            self._test_end = meta['test_end']
+            for key in self._columns:
+                self._files[key] = open(os.path.join(path, f'{key}.npy'), 'r+b')
+        else:
+            os.makedirs(path, exist_ok=True)
+            for name in os.listdir(path):
+                if name.endswith('.npy') or name == 'store.json':
+                    os.remove(os.path.join(path, name))
+            self._columns = {}
+            self._tests = []
+            self._test_end = []
+
+    @property
+    def num_rows(self):
+        return self._test_end[-1] if self._test_end else 0
+
+    @property
+    def num_tests(self):
+        return len(self._tests)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, columns, test_name=''):
+        """Appends the rows of one test, given as a dict of equally long NumPy columns."""
+        numRows = len(next(iter(columns.values())))
+        if not self._columns:
+            self._create_files(columns)
+        if set(columns) != set(self._columns):
+            raise ValueError(f'Columns {sorted(columns)} do not match the store columns {sorted(self._columns)}')
+        totalRows = self.num_rows + numRows
+        for key, info in self._columns.items():
+            values = np.ascontiguousarray(columns[key], dtype=info['dtype'])
+            if list(values.shape[1:]) != info['shape']:
+                raise ValueError(f'Column {key} has rows of shape {values.shape[1:]}, expected {tuple(info["shape"])}')
+            f = self._files[key]
+            f.seek(NPY_HEADER_BYTES + self.num_rows * _row_bytes(info))
+            f.write(values.tobytes())
+            f.seek(0)
+            f.write(npy_header(info['dtype'], [totalRows] + info['shape']))
+            f.flush()
+        self._tests.append(test_name)
+        self._test_end.append(totalRows)
+        self._save_meta()
+        if self.manifest is not None:
+            self.manifest.mark_done(test_name, self.num_rows)
+
+    @classmethod
+    def reopen(cls, path, num_tests, manifest=None):
+        """Reopens an existing store to continue it after its first num_tests tests (anything after them is dropped)."""
+        writer = cls(path, mode='a', manifest=manifest)
+        if writer.num_tests < num_tests:
+            writer.close()
+            raise ValueError(f'{path} has only {writer.num_tests} of {num_tests} tests')
+        writer.truncate(num_tests)
+        return writer
+
+    def test_names(self):
+        """Names of the tests written so far, in order."""
+        return list(self._tests)
+
+    def truncate(self, num_tests):
+        """Drops every test after the first num_tests, and any rows written after the last complete test."""
+        del self._tests[num_tests:]
+        del self._test_end[num_tests:]
+        for key, info in self._columns.items():
+            f = self._files[key]
+            f.truncate(NPY_HEADER_BYTES + self.num_rows * _row_bytes(info))
+            f.seek(0)
+            f.write(npy_header(info['dtype'], [self.num_rows] + info['shape']))
+            f.flush()
+        self._save_meta()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def _create_files(self, columns):
+        for key, values in columns.items():
+            values = np.asarray(values)
+            self._columns[key] = {'dtype': values.dtype.str, 'shape': list(values.shape[1:])}
+            self._files[key] = open(os.path.join(self.path, f'{key}.npy'), 'w+b')
+            self._files[key].write(npy_header(values.dtype, (0,) + values.shape[1:]))
+
+    def _save_meta(self):
+        tmpPath = os.path.join(self.path, 'store.json.tmp')
+        with open(tmpPath, 'w') as f:
+            json.dump({'version': STORE_VERSION, 'columns': self._columns, 'tests': self._tests,
+                       'test_end': self._test_end}, f)
+        os.replace(tmpPath, os.path.join(self.path, 'store.json'))
+
+
+def _row_bytes(info):
+    return np.dtype(info['dtype']).itemsize * int(np.prod(info['shape'], dtype=np.int64))
+
+def _read_meta(path):
+    with open(os.path.join(path, 'store.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != STORE_VERSION:
+        raise ValueError(f'Unsupported feature store version in {path}: {meta.get("version")}')
+    return meta
+
+
+class FeatureStore:
+    """
+    Read access to a NpyFeatureWriter directory. Every column is a read-only np.memmap of shape (rows, ...),
+    so slicing costs nothing and a gather such as store.rows(train_indices) only pages in the rows it reads;
+    processes opening the same store share its pages through the OS page cache.
+    """
+    def __init__(self, path, mmap_mode='r'):
+        self.path = path
+        meta = _read_meta(path)
+        self.tests = meta['tests']
+        self.test_end = np.asarray(meta['test_end'], dtype=np.int64)
+        self.num_rows = int(self.test_end[-1]) if len(self.test_end) else 0
+        self.columns = {}
+        for key, info in meta['columns'].items():
+            shape = (self.num_rows,) + tuple(info['shape'])
+            if self.num_rows == 0:
+                self.columns[key] = np.empty(shape, dtype=info['dtype'])
+            else:
+                # Rows beyond num_rows (from a test that wasn't completed) are ignored
+                self.columns[key] = np.memmap(os.path.join(path, f'{key}.npy'), dtype=info['dtype'], mode=mmap_mode,
+                                              offset=NPY_HEADER_BYTES, shape=shape)
+
+    def __len__(self):
+        return self.num_rows
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    def keys(self):
+        return self.columns.keys()
+
+    def rows(self, indices, keys=None):
+        """Dict of the selected rows (an index array, mask or slice) of every column, or of keys."""
+        return {key: self.columns[key][indices] for key in (self.columns if keys is None else keys)}
+
+    def test_rows(self, test_name):
+        """Slice of the rows produced by a test."""
+        i = self.tests.index(test_name)
+        return slice(int(self.test_end[i - 1]) if i else 0, int(self.test_end[i]))
+
+    def to_dataframe(self):
+        """DataFrame in the layout returned by process() (this reads every row)."""
+        from .feature_store import columns_to_dataframe
+        return columns_to_dataframe({key: np.asarray(values) for key, values in self.columns.items()})
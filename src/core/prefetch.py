@@ -0,0 +1,113 @@
+import time
+import threading
+import collections
+import numpy as np
+
+# Default cap on the data read ahead and not yet released by the consumer
+PREFETCH_BYTES = 1024 ** 3
+
+def payload_bytes(value):
+    """Approximate memory held by a loaded value: the NumPy arrays in it (nested in dicts, lists and tuples)."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(payload_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_bytes(item) for item in value)
+    return 0
+
+
+class PrefetchIterator:
+    """
+    Iterates over (item, load(item)) for every item, in order, running load (e.g. reading and decompressing
+    a test) up to read_ahead items ahead on a background I/O thread while the consumer processes the
+    current one. A new item is only loaded while less than max_bytes are held by loaded items that the
+    consumer hasn't released yet (an item is released when the next one is requested), so at most one
+    item's worth of data goes over the cap. read_ahead=0 loads synchronously in the consumer's thread.
+    io_time is the time spent in load and wait_time the time the consumer spent waiting for it.
+    """
+    def __init__(self, items, load, read_ahead=2, max_bytes=PREFETCH_BYTES):
+        self.items = list(items)
+        self.load = load
+        self.read_ahead = read_ahead
+        self.max_bytes = max_bytes
+        self.io_time = 0.0
+        self.wait_time = 0.0
+        self._ready = collections.deque()  # (item, loaded, exception, nbytes)
+        self._held_bytes = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        if self.read_ahead <= 0:
+            for item in self.items:
+                start = time.perf_counter()
+                loaded = self.load(item)
+                self.io_time += time.perf_counter() - start
+                self.wait_time += time.perf_counter() - start
+                yield item, loaded
+            return
+        self._thread = threading.Thread(target=self._producer, name='prefetch', daemon=True)
+        self._thread.start()
+        released = 0
+        try:
+            for _ in self.items:
+                start = time.perf_counter()
+                with self._condition:
+                    self._held_bytes -= released
+                    self._condition.notify_all()
+                    while not self._ready:
+                        self._condition.wait()
+                    item, loaded, exception, released = self._ready.popleft()
+                    self._condition.notify_all()
+                self.wait_time += time.perf_counter() - start
+                if exception is not None:
+                    raise exception
+                yield item, loaded
+        finally:
+            self.close()
+
+    def close(self):
+        """Stops the I/O thread (an item being loaded is finished first) and drops the prefetched data."""
+        with self._condition:
+            self._stopped = True
+            self._ready.clear()
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+
+    def _producer(self):
+        for item in self.items:
+            with self._condition:
+                # held_bytes also counts the item the consumer is working on, so read_ahead + 1 are in memory at most
+                while not self._stopped and (len(self._ready) >= self.read_ahead or
+                                             (self._held_bytes > 0 and self._held_bytes >= self.max_bytes)):
+                    self._condition.wait()
+                if self._stopped:
+                    return
+            start = time.perf_counter()
+            try:
+                loaded, exception = self.load(item), None
+            except Exception as e:
+                loaded, exception = None, e
+            self.io_time += time.perf_counter() - start
+            nbytes = payload_bytes(loaded)
+            with self._condition:
+                if self._stopped:
+                    return
+                self._held_bytes += nbytes
+                self._ready.append((item, loaded, exception, nbytes))
+                self._condition.notify_all()
+            if exception is not None:
+                return
@@ -0,0 +1,206 @@
+import os
+import csv
+import sys
+import json
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+from .prefetch import payload_bytes
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss():
+    """Peak resident set size of this process so far, in bytes (None where it can't be read)."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def current_rss():
+    """Current resident set size of this process in bytes, from /proc (None where it isn't available)."""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _rss_delta(before):
+    after = current_rss() if before is not None else None
+    return after - before if after is not None else None
+
+
+class Profiler:
+    """
+    Stage timers and counters for a processing run, enabled with process_dataset.py --profile.
+    instrument() wraps the VSS_Test_Reference read methods, the processing class hooks and the output
+    writer, so a normal run executes the original methods and pays nothing; everything is unwrapped on exit.
+    Times are inclusive wall times (a stage called from within itself is only counted once) and, in serial
+    runs, include the reads done on the prefetch thread. The resident memory is sampled before and after
+    every call: rss_delta_bytes is the largest growth left by a single call of the stage (its result and
+    anything it keeps), while the run-level peak_rss_bytes is the peak of the whole process. With workers > 1 the reads and the feature
+    computation happen in the worker processes and only the main process stages are measured.
+    dump='cprofile' or 'pyinstrument' also records a profile of the main thread, saved next to the report.
+    """
+    def __init__(self, dump=None):
+        self.dump = dump
+        self.stages = {}
+        self.tests = 0
+        self.slices = 0
+        self._lock = threading.Lock()
+        self._active = threading.local()
+        self._patched = []
+        self._sampler = None
+        self._start = None
+        self._elapsed = None
+
+    def __enter__(self):
+        if self.dump == 'cprofile':
+            import cProfile
+            self._sampler = cProfile.Profile()
+            self._sampler.enable()
+        elif self.dump == 'pyinstrument':
+            from pyinstrument import Profiler as Sampler
+            self._sampler = Sampler()
+            self._sampler.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._elapsed = time.perf_counter() - self._start
+        if self.dump == 'cprofile':
+            self._sampler.disable()
+        elif self.dump == 'pyinstrument':
+            self._sampler.stop()
+        for owner, attribute, original in reversed(self._patched):
+            setattr(owner, attribute, original)
+        self._patched = []
+
+    def record(self, name, seconds, nbytes=0, rss_delta=None):
+        with self._lock:
+            stage = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'bytes': 0, 'rss_delta_bytes': None})
+            stage['calls'] += 1
+            stage['seconds'] += seconds
+            stage['bytes'] += nbytes
+            if rss_delta is not None:
+                stage['rss_delta_bytes'] = max(stage['rss_delta_bytes'] or 0, rss_delta)
+
+    @contextmanager
+    def stage(self, name):
+        rss = current_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.record(name, seconds, rss_delta=_rss_delta(rss))
+
+    def wrap(self, owner, attribute, name, count_bytes=None):
+        """
+        Replaces owner.attribute with a timed version recorded under stage name (until the profiler exits).
+        count_bytes='result' (or 'args') also adds up the size of the arrays returned by (or passed to) each call.
+        """
+        original = owner.__dict__.get(attribute)
+        if original is None:
+            return
+        profiler = self
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            active = profiler._active.__dict__.setdefault('stages', set())
+            if name in active:
+                return original(*args, **kwargs)
+            active.add(name)
+            rss = current_rss()
+            start = time.perf_counter()
+            try:
+                result = original(*args, **kwargs)
+            finally:
+                active.discard(name)
+            seconds = time.perf_counter() - start
+            rssDelta = _rss_delta(rss)
+            nbytes = payload_bytes(result if count_bytes == 'result' else args[1:]) if count_bytes else 0
+            profiler.record(name, seconds, nbytes, rssDelta)
+            return result
+        setattr(owner, attribute, timed)
+        self._patched.append((owner, attribute, original))
+
+    def instrument(self, processing_class):
+        """Wraps the read methods, the hooks of processing_class (and its bases) and the feature writer."""
+        from .database import VSS_File
+        from .feature_store import FeatureWriter
+        from .npy_store import NpyFeatureWriter
+        from ..processing import processing_classes
+        test_class = VSS_File.VSS_Unit_Reference.VSS_Test_Reference
+        for attribute in ('returnVibrationDatabase', 'returnVibrationArray', 'splitVibrationBlock'):
+            self.wrap(test_class, attribute, 'read_vibration', count_bytes='result')
+        for attribute in ('returnNumericalDatabase', 'returnNumericalArray', 'returnNumericalSummary', 'returnVibrationRMS'):
+            self.wrap(test_class, attribute, 'read_numerical', count_bytes='result')
+        for cls in processing_class.__mro__:
+            for attribute in ('extract_metadata', 'process_slice', 'process_slices', 'sweep_slices'):
+                self.wrap(cls, attribute, attribute)
+        self.wrap(FeatureWriter, 'append', 'write_h5', count_bytes='args')
+        self.wrap(NpyFeatureWriter, 'append', 'write_npy', count_bytes='args')
+        self.wrap(processing_classes, 'columns_to_dataframe', 'dataframe')
+        self._wrap_counter(processing_classes.BaseProcessing)
+        self._wrap_counter(processing_classes.ConfigSweep)
+
+    def _wrap_counter(self, base):
+        # Tests and slices are counted from the columns yielded for every test (in serial and worker runs);
+        # a ConfigSweep yields a list of columns per test, counted once
+        original = base.iterate_tests
+        profiler = self
+
+        @functools.wraps(original)
+        def counted(*args, **kwargs):
+            for result in original(*args, **kwargs):
+                columns = result[0] if isinstance(result, list) else result
+                with profiler._lock:
+                    profiler.tests += 1
+                    profiler.slices += len(next(iter(columns.values()))) if columns else 0
+                yield result
+        base.iterate_tests = counted
+        self._patched.append((base, 'iterate_tests', original))
+
+    def report(self):
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._start
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = dict(stage)
+            if stage['bytes'] and stage['seconds']:
+                stages[name]['MB/s'] = stage['bytes'] / stage['seconds'] / 1e6
+        return {
+            'total_seconds': elapsed,
+            'tests': self.tests,
+            'slices': self.slices,
+            'slices/s': self.slices / elapsed if elapsed else None,
+            'peak_rss_bytes': peak_rss(),
+            'stages': stages,
+        }
+
+    def save(self, path):
+        """Writes the report as JSON, or as one CSV row per stage if path ends in .csv, plus the profile dump."""
+        report = self.report()
+        if path.endswith('.csv'):
+            fields = ['stage', 'calls', 'seconds', 'bytes', 'MB/s', 'rss_delta_bytes', 'peak_rss_bytes']
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                for name, stage in report['stages'].items():
+                    writer.writerow({'stage': name, **stage})
+                writer.writerow({'stage': 'total', 'calls': report['tests'], 'seconds': report['total_seconds'],
+                                 'peak_rss_bytes': report['peak_rss_bytes']})
+        else:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+        base = os.path.splitext(path)[0]
+        if self.dump == 'cprofile':
+            self._sampler.dump_stats(f'{base}.prof')
+        elif self.dump == 'pyinstrument':
+            with open(f'{base}.html', 'w') as f:
+                f.write(self._sampler.output_html())
+        return report
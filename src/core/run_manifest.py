@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+
+def config_hash(params):
+    """Stable hash of a processing_configs.json entry; any parameter change gives a new hash."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+class RunManifest:
+    """
+    JSON manifest of a processing run, stored beside its output. Records the (method, config, slice)
+    and the hash of the config parameters, plus the test groups (VSS_Test_Reference.name) whose rows
+    have already been written, in write order. It is rewritten atomically after every test, so
+    an interrupted run can be resumed with the tests that are still missing.
+    The output of a --shard i/N run also records its shard and the tests of the whole slice (in
+    processing order), which src/utils/merge_shards.py uses to validate and order the merged output.
+    """
+    def __init__(self, path, method, config, dataset_slice, params, total_tests=None, shard=None, slice_tests=None):
+        self.path = path
+        self.key = {
+            'method': method,
+            'config': config,
+            'slice': dataset_slice,
+            'config_hash': config_hash(params),
+        }
+        if shard is not None:
+            self.key['shard'] = list(shard)
+        self.total_tests = total_tests
+        self.slice_tests = slice_tests
+        self.completed = []
+        self.num_rows = 0
+
+    @classmethod
+    def load(cls, path, method, config, dataset_slice, params, shard=None):
+        """Loads the manifest at path, or returns None if there isn't one or it belongs to another run/config."""
+        manifest = cls(path, method, config, dataset_slice, params, shard=shard)
+        saved = cls.read(path)
+        if saved is None or saved.get('key') != manifest.key:
+            return None
+        manifest.total_tests = saved.get('total_tests')
+        manifest.slice_tests = saved.get('slice_tests')
+        manifest.completed = saved['completed']
+        manifest.num_rows = saved['num_rows']
+        return manifest
+
+    @staticmethod
+    def read(path):
+        """The saved manifest at path as a dict (None if it is missing or unreadable)."""
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def mark_done(self, test_name, num_rows):
+        """Records a test as written (num_rows = total rows in the output after it) and saves the manifest."""
+        self.completed.append(test_name)
+        self.num_rows = num_rows
+        self.save()
+
+    def save(self):
+        tmpPath = f'{self.path}.tmp'
+        with open(tmpPath, 'w') as f:
+            saved = {
+                'key': self.key,
+                'total_tests': self.total_tests,
+                'num_rows': self.num_rows,
+                'completed': self.completed,
+            }
+            if self.slice_tests is not None:
+                saved['slice_tests'] = self.slice_tests
+            json.dump(saved, f)
+        os.replace(tmpPath, self.path)
@@ -0,0 +1,28 @@
+import hashlib
+
+# A slice is split into N shards by a hash of each test group path ('/1/A1-...'), so every machine picks
+# the same tests for shard i regardless of the order, host or Python version (unlike the builtin hash()).
+# Shards are numbered 0..N-1 on the command line: --shard 0/3, --shard 1/3, --shard 2/3.
+
+def parse_shard(text):
+    """(index, count) of a 'i/N' shard specification."""
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f'Invalid shard: {text} (expected i/N, e.g. 0/4)')
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f'Invalid shard: {text} (i must be between 0 and N-1)')
+    return index, count
+
+def shard_of(test_name, count):
+    """Shard (0..count-1) of a test group path."""
+    digest = hashlib.sha1(str(test_name).encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+def select_shard(tests, index, count):
+    """The tests (VSS_Test_Reference objects or group paths) of shard index, in their original order."""
+    return [test for test in tests if shard_of(getattr(test, 'name', test), count) == index]
+
+def shard_suffix(index, count):
+    """Suffix of the partial output of a shard, e.g. '<slice>.shard-0-of-4.h5'."""
+    return f'.shard-{index}-of-{count}'
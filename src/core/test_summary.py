@@ -0,0 +1,68 @@
+import numpy as np
+
+# Per-test summary statistics, stored as attrs aligned with 'columnNames':
+#   numericalMeasurements: 'mean', 'std', 'min', 'max' (NaN-aware, like pandas' mean)
+#   vibrationMeasurements: 'rms' of every axis
+# They are written by convert_from_files.py (or by src/utils/backfill_summaries.py on existing files)
+# and read by VSS_Test_Reference.returnNumericalSummary/returnVibrationRMS.
+NUMERICAL_STATS = ('mean', 'std', 'min', 'max')
+
+# Columns of numericalMeasurements whose per-test means are kept in the metadata index (and can be filtered on)
+NUMERICAL_COLUMNS = ['rpm', 't_evap_ref', 't_cond_ref', 't_evap', 't_cond', 't_suc', 't_comp', 't_dis', 'p_suc', 'p_int', 'p_dis']
+
+def numerical_summary(columns):
+    """Statistics of a (columns, N) array along N, as a dict of float64 arrays (one value per column)."""
+    # Contiguous rows reduced along axis 1: the same sums as extract_metadata's nanmean over returnNumericalArray
+    columns = np.ascontiguousarray(columns, dtype=np.float64)
+    if columns.shape[1] == 0:
+        return {stat: np.full(columns.shape[0], np.nan) for stat in NUMERICAL_STATS}
+    return {
+        'mean': np.nanmean(columns, axis=1),
+        'std': np.nanstd(columns, axis=1),
+        'min': np.nanmin(columns, axis=1),
+        'max': np.nanmax(columns, axis=1),
+    }
+
+def vibration_rms(axes):
+    """RMS of every row of a (axes, N) array."""
+    axes = np.ascontiguousarray(axes, dtype=np.float64)
+    return np.sqrt(np.mean(axes**2, axis=1)) if axes.shape[1] else np.full(axes.shape[0], np.nan)
+
+def write_summary_attrs(numDataset, numSummary, vibDataset=None, vibRms=None):
+    for stat, values in numSummary.items():
+        numDataset.attrs[stat] = values
+    if vibDataset is not None:
+        vibDataset.attrs['rms'] = vibRms
+
+def has_summary(testGroup):
+    return ('numericalMeasurements' in testGroup and 'mean' in testGroup['numericalMeasurements'].attrs
+            and ('vibrationMeasurements' not in testGroup or 'rms' in testGroup['vibrationMeasurements'].attrs))
+
+def summarize_test(testGroup):
+    """Computes and stores the summary attrs of an existing test group (opened for writing)."""
+    numDataset = testGroup['numericalMeasurements']
+    vibDataset = testGroup.get('vibrationMeasurements')
+    numSummary = numerical_summary(numDataset[()].T)
+    vibRms = None
+    if vibDataset is not None:
+        data = vibDataset[()]
+        vibRms = vibration_rms(data if vibDataset.attrs.get('layout') == 'axis-major' else data.T)
+    write_summary_attrs(numDataset, numSummary, vibDataset, vibRms)
+
+def numerical_means(testGroup):
+    """
+    Per-test means of NUMERICAL_COLUMNS from the summary attrs (NaN for missing columns), or None when
+    the test has no summary: the data itself is not read (see backfill_summaries.py).
+    """
+    if 'numericalMeasurements' not in testGroup:
+        return np.full(len(NUMERICAL_COLUMNS), np.nan)
+    dataset = testGroup['numericalMeasurements']
+    if 'mean' not in dataset.attrs:
+        return None
+    means = np.full(len(NUMERICAL_COLUMNS), np.nan)
+    headers = list(dataset.attrs.get('columnNames', []))
+    values = dataset.attrs['mean']
+    for i, column in enumerate(NUMERICAL_COLUMNS):
+        if column in headers:
+            means[i] = values[headers.index(column)]
+    return means
@@ -1,50 +1,195 @@
+import threading
 import numpy as np
+from functools import lru_cache
+
+# ----------------------
+# FFT backend
+# ----------------------
+# Real-input transforms go through rfft(), which uses pyFFTW (with a cached plan per shape) when it is
+# installed, otherwise scipy.fft, otherwise numpy.fft. Every transform function takes optional backend and
+# threads arguments (processing classes pass their 'fft_backend'/'fft_threads' opts); without them the
+# defaults chosen with set_fft_backend are used. A backend is only imported on its first transform.
+FFT_BACKENDS = ['auto', 'pyfftw', 'scipy', 'numpy']
+_fft_settings = {'backend': 'auto', 'threads': 1}
+_resolved_backends = {}  # requested backend -> backend used
+_thread_state = threading.local()  # pyFFTW plans and workspace buffers are not shared between threads
+
+def set_fft_backend(backend='auto', threads=1):
+    """Sets the default FFT backend ('auto', 'pyfftw', 'scipy' or 'numpy') and threads per transform."""
+    check_fft_backend(backend)
+    _fft_settings.update(backend=backend, threads=max(1, int(threads)))
+
+def check_fft_backend(backend):
+    if backend not in FFT_BACKENDS:
+        raise ValueError(f'Unknown FFT backend: {backend}')
+
+def fft_backend(backend=None):
+    """Name of the backend rfft uses for backend (default: the set_fft_backend one), resolving 'auto' to the first one installed."""
+    requested = _fft_settings['backend'] if backend is None else backend
+    if requested not in _resolved_backends:
+        check_fft_backend(requested)
+        candidates = FFT_BACKENDS[1:] if requested == 'auto' else [requested]
+        for name in candidates:
+            try:
+                if name == 'pyfftw':
+                    import pyfftw.builders  # noqa: F401
+                elif name == 'scipy':
+                    import scipy.fft  # noqa: F401
+            except ImportError:
+                if requested != 'auto':
+                    raise
+                continue
+            _resolved_backends[requested] = name
+            break
+    return _resolved_backends[requested]
+
+def fft_threads(threads=None):
+    """Threads per transform rfft uses for threads (default: the set_fft_backend ones)."""
+    return _fft_settings['threads'] if threads is None else max(1, int(threads))
+
+def _thread_cache(name):
+    cache = getattr(_thread_state, name, None)
+    if cache is None:
+        cache = {}
+        setattr(_thread_state, name, cache)
+    return cache
+
+def _fftw_plan(shape, dtype, threads):
+    """pyFFTW rfft plan along the last axis for inputs of this shape, built once per thread."""
+    plans = _thread_cache('plans')
+    key = (shape, dtype.str, threads)
+    if key not in plans:
+        import pyfftw.builders
+        if len(plans) >= 16:
+            plans.clear()
+        plans[key] = pyfftw.builders.rfft(np.empty(shape, dtype), axis=-1, threads=threads, planner_effort='FFTW_MEASURE')
+    return plans[key]
+
+def rfft(y, backend=None, threads=None):
+    """
+    Real-input FFT along the last axis with backend and threads (default: set_fft_backend's). With pyFFTW
+    the result is the plan's output buffer, which the next transform of the same shape overwrites: copy it
+    if it must be kept.
+    """
+    y = np.asarray(y)
+    backend = fft_backend(backend)
+    threads = fft_threads(threads)
+    if backend == 'pyfftw':
+        return _fftw_plan(y.shape, y.dtype, threads)(y)
+    if backend == 'scipy':
+        import scipy.fft
+        return scipy.fft.rfft(y, axis=-1, workers=threads)
+    return np.fft.rfft(y, axis=-1)
+
+def _workspace(shape, dtype):
+    """Per-thread scratch array reused by every call with the same shape (slice lengths are fixed within a run)."""
+    buffers = _thread_cache('buffers')
+    key = (shape, np.dtype(dtype).str)
+    if key not in buffers:
+        if len(buffers) >= 16:
+            buffers.clear()
+        buffers[key] = np.empty(shape, dtype)
+    return buffers[key]
+
+def _spectrum_into(y, size, out, backend=None, threads=None):
+    """Writes the one-sided amplitude spectrum of y (scaled like raw_fft) into out and returns it."""
+    ft = rfft(y, backend, threads)[..., :out.shape[-1]]
+    np.abs(ft, out=out)
+    out /= size
+    out[..., 1:-1] *= 2
+    return out
+
+def _spectrum_shape(y, size):
+    return y.shape[:-1] + (min(y.shape[-1] // 2 + 1, size // 2 + 1),)
+
+def _real_dtype(y):
+    # float32 signals keep a float32/complex64 path end to end; anything else is computed in float64
+    return np.float32 if y.dtype == np.float32 else np.float64
 
 def raw_fft(y, Fs=51200):
+    y = np.asarray(y)
     size = len(y)
-    ft = np.fft.fft(y)
-    P2 = np.abs(ft / size)
-    ft = P2[:size // 2 + 1]
-    ft[1:-1] = 2 * ft[1:-1]
-    return ft
+    return _spectrum_into(y, size, np.empty(_spectrum_shape(y, size), _real_dtype(y)))
 
-def band_filter(ft,t=1,dur=200,sup=0.1,fim=25600,db_ref = 5*(10**-8)):
+@lru_cache(maxsize=None)
+def band_edges(t=1, dur=200, sup=0.1, fim=25600):
+    """
+    Start/stop FFT points of every band summed by band_reduce (band_energies, band_filter).
+    Computed once per (t, dur, sup) and shared by all calls with the same configuration.
+    """
     sup = dur * sup
     freq = 1 / t  # step frequency of each FFT point
-    fim = 25600
     dur_points = round(dur / freq)  # duration of the range in points
     sup_points = round(sup / freq)  # duration of the overlap in points
     len_fft = round(fim / freq)  # total number of points
     n_bands_fft = int(1 + np.ceil((len_fft - dur_points) / (dur_points - sup_points)))  # number of FFT bands
-    i_start = 0
-    amostra_fft = np.empty(n_bands_fft)
-    for j in range(n_bands_fft - 1):
-        band = ft[i_start:i_start + dur_points]
-        amostra_fft[j] = np.sum(band ** 2)  # energy
-        i_start = i_start + dur_points - sup_points
-    band = ft[i_start:len_fft]  # last band
-    amostra_fft[n_bands_fft - 1] = np.sum(band ** 2)  # energy
+    starts = np.arange(n_bands_fft) * (dur_points - sup_points)
+    stops = starts + dur_points
+    stops[-1] = len_fft  # last band goes up to the end of the spectrum
+    starts.flags.writeable = False
+    stops.flags.writeable = False
+    return starts, stops
+
+@lru_cache(maxsize=32)
+def band_matrix(n_bins, t=1, dur=200, sup=0.1, dtype=np.float64):
+    """
+    Sparse (n_bands, n_bins) aggregation matrix with ones over the points of each band,
+    so that the energies of many spectra are obtained with a single sparse product (in dtype).
+    """
+    from scipy import sparse
+    starts, stops = band_edges(t, dur, sup)
+    stops = np.clip(stops, 0, n_bins)
+    starts = np.minimum(starts, stops)
+    lengths = stops - starts
+    rows = np.repeat(np.arange(len(starts)), lengths)
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    cols = np.arange(lengths.sum()) - offsets + np.repeat(starts, lengths)
+    return sparse.csr_matrix((np.ones(len(rows), dtype=dtype), (rows, cols)), shape=(len(starts), n_bins))
+
+def amplitude_spectrum(y, size=None, backend=None, threads=None):
+    """
+    One-sided amplitude spectrum along the last axis of y, scaled like raw_fft.
+    size is the number of points used for the scaling (defaults to the signal length).
+    """
+    y = np.asarray(y)
+    if size is None:
+        size = y.shape[-1]
+    return _spectrum_into(y, size, np.empty(_spectrum_shape(y, size), _real_dtype(y)), backend, threads)
+
+def band_reduce(power, t=1, dur=200, sup=0.1):
+    """Sums power (..., n_bins) over every band, returning (..., n_bands)."""
+    power = np.asarray(power)
+    n_bins = power.shape[-1]
+    M = band_matrix(n_bins, t, dur, sup, _real_dtype(power))
+    energies = M @ power.reshape(-1, n_bins).T
+    return energies.T.reshape(power.shape[:-1] + (M.shape[0],))
+
+def power_spectrum(block, Fs=51200, t=1, backend=None, threads=None):
+    """
+    Squared amplitude spectrum of every signal in block (..., n_samples), as summed by band_reduce.
+    It is computed in a reused workspace buffer, overwritten by the next call with the same shape.
+    """
+    block = np.asarray(block)
+    size = int(Fs * t)
+    power = _spectrum_into(block, size, _workspace(_spectrum_shape(block, size), _real_dtype(block)), backend, threads)
+    np.square(power, out=power)
+    return power
+
+def band_energies(block, Fs=51200, t=1, dur=200, sup=0.1, backend=None, threads=None):
+    """
+    Vectorized ahryman_filter: band energies of every signal in block (..., n_samples),
+    e.g. a whole (n_slices, 3, n_samples) test, computed with one rfft and one reduction.
+    The spectrum of a block can also be reduced with several band layouts (see bandas_fft.sweep_slices).
+    """
+    return band_reduce(power_spectrum(block, Fs, t, backend, threads), t, dur, sup)
+
+def band_filter(ft,t=1,dur=200,sup=0.1,fim=25600,db_ref = 5*(10**-8)):
+    amostra_fft = band_reduce(np.asarray(ft) ** 2, t, dur, sup)  # energy
     return 20*np.log10(amostra_fft/db_ref)
 
 def ahryman_filter(y,Fs=51200,t=1,dur=200,sup=0.1,db_ref = 5*(10**-8)):
-    size = int(Fs * t)
-    sup = dur * sup
-    freq = 1 / t  # step frequency of each FFT point
-    fim = 25600
-    dur_points = round(dur / freq)  # duration of the range in points
-    sup_points = round(sup / freq)  # duration of the overlap in points
-    len_fft = round(fim / freq)  # total number of points
-    n_bands_fft = int(1 + np.ceil((len_fft - dur_points) / (dur_points - sup_points)))  # number of FFT bands
-    ft = np.fft.fft(y)  # calculates FFT of v
-    P2 = np.abs(ft / size)
-    ft = P2[:size // 2 + 1]
-    ft[1:-1] = 2 * ft[1:-1]
-    i_start = 0
-    amostra_fft = np.empty(n_bands_fft)
-    for j in range(n_bands_fft - 1):
-        band = ft[i_start:i_start + dur_points]
-        amostra_fft[j] = np.sum(band ** 2)  # energy
-        i_start = i_start + dur_points - sup_points
-    band = ft[i_start:len_fft]  # last band
-    amostra_fft[n_bands_fft - 1] = np.sum(band ** 2)  # energy
-    return amostra_fft
+    """
+    Kept for compatibility: same as band_energies. It returns linear band energies, never dB (use band_filter
+    for those); db_ref is ignored, as it always was, and only accepted so existing calls keep working.
+    """
+    return band_energies(y, Fs, t, dur, sup)
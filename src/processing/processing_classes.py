@@ -1,32 +1,58 @@
 
 import numpy as np
-import pandas as pd
 import tqdm
-import tensorflow as tf
-from scipy import signal
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
 import os
+import time
+import multiprocessing
 
-from .fft import raw_fft, ahryman_filter
-# from .timefreq import ... (import as needed)
+from .fft import band_energies, band_reduce, power_spectrum, check_fft_backend, fft_backend, fft_threads
+from ..core.feature_store import rows_to_columns, columns_to_dataframe
+from ..core.prefetch import PrefetchIterator, PREFETCH_BYTES
+from .timefreq import WINDOWS, num_frames, stft_power, stft_band_energies
+
+
+# Values of the 'precision' processing opt: dtype of the vibration data and features (None = as stored)
+PRECISIONS = {'float64': None, 'float32': np.float32}
 
 
 class BaseProcessing:
     """
     Flexible base class for dataset processing. Handles common logic for extracting metadata,
     looping over tests, and building the output DataFrame. Subclasses should implement process_slice,
-    which returns a dict of features for each slice (keys = feature names, values = feature values).
+    which returns a dict of features for each slice (keys = feature names, values = feature values),
+    or, to compute all the slices of a test at once, process_slices, which returns feature columns.
     """
+    # Bump in a subclass whenever the features it computes change, so cached results are not reused
+    version = 1
+
     def __init__(self, dataset_slice, dataset_list, opts):
         self.name = self.__class__.__name__
         self.dataset_slice = dataset_slice
         self.dataset_list = dataset_list
         self.opts = opts
+        # Optional FFT backend and threads per transform, passed to the transforms of this instance only
+        # (None keeps the defaults of fft.set_fft_backend)
+        if opts.get('fft_backend') is not None:
+            check_fft_backend(opts['fft_backend'])
+        self.fft = {'backend': opts.get('fft_backend'), 'threads': opts.get('fft_threads')}
+        # 'precision': 'float32' reads the vibration data as float32, keeps the FFTs in float32/complex64
+        # and writes float32 feature columns; the default 'float64' keeps the stored precision
+        precision = opts.get('precision', 'float64')
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+        self.dtype = PRECISIONS[precision]
 
     def extract_metadata(self, test):
         """Extracts and returns metadata for a test as a dict."""
-        testTemperatures = np.float32(test.returnNumericalDataframe()[["t_evap", "t_cond"]].mean())
-        testPressures = np.float32(test.returnNumericalDataframe()[["p_suc", "p_dis"]].mean())
+        # Means stored at conversion time (see core.test_summary) when present, otherwise one read of
+        # numericalMeasurements for the four means (nanmean to match pandas' mean)
+        columns = ["t_evap", "t_cond", "p_suc", "p_dis"]
+        testMeans = test.returnNumericalSummary("mean", columns)
+        if testMeans is None:
+            testMeans = np.nanmean(test.returnNumericalArray(columns), axis=1)
+        testMeans = np.float32(testMeans)
+        testTemperatures, testPressures = testMeans[:2], testMeans[2:]
         testConditions = test.returnAttributeDict()
         return {
             'unit': int(test.unit[1]),
@@ -39,24 +65,110 @@ class BaseProcessing:
             'p_dis': testPressures[1],
         }
 
-    def process(self):
+    def process(self, workers=1, writer=None, cache=None, read_ahead=2, prefetch_bytes=PREFETCH_BYTES):
         """
         Main processing loop. Subclasses should override process_slice to define
         how to process each set of vibration slices. process_slice must return a dict of features.
+        With workers > 1 the tests are distributed over a process pool; rows keep the original order.
+        If a writer (see core.feature_store.FeatureWriter) is given, the rows of each test are streamed
+        to it as soon as the test finishes and nothing is returned; otherwise the DataFrame is returned.
+        If a cache (see core.feature_cache.FeatureCache) is given, tests already processed with the same
+        class, version and opts are read from it instead of being recomputed.
+        In a serial run the next read_ahead tests are read on a background thread while the current one is
+        processed, holding at most about prefetch_bytes of read-ahead data (read_ahead=0 reads synchronously).
         """
-        num_slices = self.opts['num_slices']
-        rows = []
-        for test in tqdm.tqdm(self.dataset_list, desc="Test", position=0, bar_format='{l_bar}{bar:10}{r_bar}{bar:-10b}'):
-            metadata = self.extract_metadata(test)
-            # By default, assume 3-axis vibration. Subclasses can override this logic if needed.
-            testVibrationsX = test.splitVibrationWaveform(num_slices, "x")
-            testVibrationsY = test.splitVibrationWaveform(num_slices, "y")
-            testVibrationsZ = test.splitVibrationWaveform(num_slices, "z")
-            for x, y, z in zip(testVibrationsX, testVibrationsY, testVibrationsZ):
-                features = self.process_slice(x, y, z, test)
-                row = {**metadata, **features}
-                rows.append(row)
-        return pd.DataFrame(rows)
+        tests = self.iterate_tests(workers, cache, read_ahead, prefetch_bytes)
+        if writer is not None:
+            for test, columns in zip(self.dataset_list, tests):
+                if columns:
+                    writer.append(columns, test.name)
+            return None
+        results = [columns for columns in tests if columns]
+        if not results:
+            return columns_to_dataframe({})
+        return columns_to_dataframe({key: np.concatenate([columns[key] for columns in results]) for key in results[0]})
+
+    def iterate_tests(self, workers=1, cache=None, read_ahead=2, prefetch_bytes=PREFETCH_BYTES):
+        """Yields the feature columns of each test in dataset_list, in order, processing them in `workers` processes."""
+        bar = dict(desc="Test", position=0, total=len(self.dataset_list), bar_format='{l_bar}{bar:10}{r_bar}{bar:-10b}')
+        if workers <= 1 or len(self.dataset_list) <= 1:
+            with PrefetchIterator(self.dataset_list, lambda test: self.load_test(test, cache), read_ahead, prefetch_bytes) as reader:
+                progress = tqdm.tqdm(reader, **bar)
+                computeTime = 0.0
+                for test, loaded in progress:
+                    start = time.perf_counter()
+                    columns = self.process_test_columns(test, cache, loaded)
+                    computeTime += time.perf_counter() - start
+                    progress.set_postfix_str(f'io wait {reader.wait_time:.1f}s, compute {computeTime:.1f}s', refresh=False)
+                    yield columns
+            return
+        # h5py handles can't be pickled: each worker opens the file itself and receives test group names.
+        # 'spawn' keeps workers from inheriting the parent's open HDF5 library state (and is what Windows uses anyway).
+        initargs = (type(self), dict(dataset_slice=self.dataset_slice, opts=self.opts), self.dataset_list[0]._h5file.path, cache)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=initargs) as executor:
+            testNames = [test.name for test in self.dataset_list]
+            yield from tqdm.tqdm(_ordered_map(executor, _process_test_in_worker, testNames, 2 * workers), **bar)
+
+    def cache_key(self, test, cache):
+        return cache.key(test._h5file.path, test.name, f'{type(self).__module__}.{type(self).__qualname__}', self.version, self.opts)
+
+    def load_test(self, test, cache=None):
+        """
+        Reads everything needed to compute the columns of a test: its cached columns (a dict) if the cache
+        has them, otherwise the (metadata, vibration block) tuple consumed by process_test.
+        Only file/cache I/O happens here, so it can run on the prefetch thread.
+        """
+        if cache is not None:
+            columns = cache.get(self.cache_key(test, cache))
+            if columns is not None:
+                return columns
+        # By default, assume 3-axis vibration. Subclasses can override this logic if needed.
+        # The vibration dataset is decompressed once into a (num_slices, 3, samples) block.
+        return self.extract_metadata(test), test.splitVibrationBlock(self.opts['num_slices'], ("x", "y", "z"), self.dtype)
+
+    def process_test_columns(self, test, cache=None, loaded=None):
+        """Feature columns of a single test (dict of arrays, one entry per slice), read from cache when possible."""
+        if loaded is None:
+            loaded = self.load_test(test, cache)
+        if isinstance(loaded, dict):
+            return loaded
+        columns = self.process_test(test, loaded)
+        if cache is not None and columns:
+            cache.put(self.cache_key(test, cache), columns)
+        return columns
+
+    def process_test(self, test, loaded=None):
+        """Processes every slice of a single test, returning its columns (metadata + features, one entry per slice)."""
+        metadata, testVibrations = self.load_test(test) if loaded is None else loaded
+        if len(testVibrations) == 0:
+            return {}
+        return self.test_columns(metadata, len(testVibrations), self.process_slices(testVibrations, test))
+
+    def test_columns(self, metadata, num_slices, features):
+        """Output columns of a test: its metadata repeated for every slice, plus the features (cast to self.dtype)."""
+        columns = {key: np.repeat(np.asarray(value)[np.newaxis], num_slices, axis=0) for key, value in metadata.items()}
+        if self.dtype is not None:
+            features = {key: values.astype(self.dtype, copy=False) if values.dtype.kind == 'f' else values
+                        for key, values in features.items()}
+        columns.update(features)
+        return columns
+
+    def process_slices(self, block, test):
+        """
+        Process every slice of a test at once. block is the (num_slices, 3, samples) array of the x, y, z
+        slices; returns a dict of feature columns, each with one entry per slice along the first axis.
+        Subclasses can override this to vectorize over slices; by default process_slice is called per slice.
+        """
+        return rows_to_columns([self.process_slice(x, y, z, test) for x, y, z in block])
+
+    def sweep_slices(self, block, test, processors):
+        """
+        Features of the same block for every processor of a ConfigSweep (instances of this class with other
+        opts), as a list of process_slices results. Subclasses can override this to share work between the
+        configurations, e.g. a spectrum; by default each processor processes the block on its own.
+        """
+        return [processor.process_slices(block, test) for processor in processors]
 
     def process_slice(self, x, y, z, test):
         """
@@ -66,6 +178,126 @@ class BaseProcessing:
         raise NotImplementedError
 
 
+class ConfigSweep:
+    """
+    Runs one processing class with several opts (e.g. band layouts of processing_configs.json), reading and
+    splitting every test only once: the block is handed to sweep_slices, which returns the features of each
+    configuration. All opts must share num_slices and precision, since the block is the same for all of them,
+    and the FFT backend/threads, since its spectrum is computed once.
+    Rows of every configuration are identical to a separate run of the class with those opts.
+    """
+    def __init__(self, processing_class, dataset_slice, dataset_list, opts_list):
+        if not opts_list:
+            raise ValueError('A sweep needs at least one configuration')
+        self.processing_class = processing_class
+        self.dataset_slice = dataset_slice
+        self.dataset_list = dataset_list
+        self.opts_list = opts_list
+        self.processors = [processing_class(dataset_slice, dataset_list, opts) for opts in opts_list]
+        settings = [self.shared_settings(processor) for processor in self.processors]
+        for key in settings[0]:
+            values = list(dict.fromkeys(setting[key] for setting in settings))
+            if len(values) > 1:
+                raise ValueError(f'All the configurations of a sweep must have the same {key} (got {", ".join(map(str, values))})')
+        self.name = self.processors[0].name
+
+    @staticmethod
+    def shared_settings(processor):
+        """
+        Settings that determine the loaded block or its shared spectrum, as the processor applies them
+        (an omitted precision is float64, omitted FFT options are the defaults), so they must be equal.
+        """
+        return {'num_slices': processor.opts.get('num_slices'),
+                'precision': np.dtype(processor.dtype or np.float64).name,
+                'fft_backend': fft_backend(processor.fft['backend']),
+                'fft_threads': fft_threads(processor.fft['threads'])}
+
+    def process(self, workers=1, writers=None, cache=None, read_ahead=2, prefetch_bytes=PREFETCH_BYTES):
+        """
+        Like BaseProcessing.process, with one writer per configuration (in the order of opts_list).
+        Without writers, the list of DataFrames (one per configuration) is returned.
+        """
+        tests = self.iterate_tests(workers, cache, read_ahead, prefetch_bytes)
+        if writers is not None:
+            for test, results in zip(self.dataset_list, tests):
+                for writer, columns in zip(writers, results):
+                    if columns:
+                        writer.append(columns, test.name)
+            return None
+        results = [columns for columns in tests if columns[0]]
+        return [columns_to_dataframe({key: np.concatenate([columns[i][key] for columns in results]) for key in results[0][i]})
+                if results else columns_to_dataframe({}) for i in range(len(self.processors))]
+
+    def iterate_tests(self, workers=1, cache=None, read_ahead=2, prefetch_bytes=PREFETCH_BYTES):
+        """Yields, for each test in dataset_list, the list of its feature columns under every configuration."""
+        bar = dict(desc="Test", position=0, total=len(self.dataset_list), bar_format='{l_bar}{bar:10}{r_bar}{bar:-10b}')
+        if workers <= 1 or len(self.dataset_list) <= 1:
+            with PrefetchIterator(self.dataset_list, lambda test: self.load_test(test, cache), read_ahead, prefetch_bytes) as reader:
+                for test, loaded in tqdm.tqdm(reader, **bar):
+                    yield self.process_test_columns(test, cache, loaded)
+            return
+        runnerKwargs = dict(processing_class=self.processing_class, dataset_slice=self.dataset_slice, opts_list=self.opts_list)
+        initargs = (type(self), runnerKwargs, self.dataset_list[0]._h5file.path, cache)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=initargs) as executor:
+            testNames = [test.name for test in self.dataset_list]
+            yield from tqdm.tqdm(_ordered_map(executor, _process_test_in_worker, testNames, 2 * workers), **bar)
+
+    def load_test(self, test, cache=None):
+        """The cached columns of every configuration, plus the (metadata, block) of the test if any of them is missing."""
+        cached = [None] * len(self.processors)
+        if cache is not None:
+            cached = [cache.get(processor.cache_key(test, cache)) for processor in self.processors]
+            if all(columns is not None for columns in cached):
+                return cached, None
+        return cached, self.processors[0].load_test(test)
+
+    def process_test_columns(self, test, cache=None, loaded=None):
+        """Feature columns of a single test under every configuration, computing only those not cached."""
+        cached, testData = self.load_test(test, cache) if loaded is None else loaded
+        if testData is None:
+            return cached
+        metadata, block = testData
+        if len(block) == 0:
+            return [{} for _ in self.processors]
+        missing = [i for i, columns in enumerate(cached) if columns is None]
+        features = self.processors[0].sweep_slices(block, test, [self.processors[i] for i in missing])
+        results = list(cached)
+        for i, values in zip(missing, features):
+            processor = self.processors[i]
+            results[i] = processor.test_columns(metadata, len(block), values)
+            if cache is not None:
+                cache.put(processor.cache_key(test, cache), results[i])
+        return results
+
+
+# ----------------------
+# Process pool helpers (module level so they can be pickled)
+# ----------------------
+_worker_state = {}
+
+def _init_worker(runner_class, runner_kwargs, dataset_path, cache):
+    # runner_class is a processing class or ConfigSweep, built from its keyword arguments with an empty
+    # dataset_list (tests are sent by name), whatever the order of its constructor parameters
+    from ..core.database import VSS_File
+    _worker_state['dataset'] = VSS_File(dataset_path)
+    _worker_state['processing'] = runner_class(dataset_list=[], **runner_kwargs)
+    _worker_state['cache'] = cache
+
+def _process_test_in_worker(test_name):
+    test = _worker_state['dataset'].returnTestReference(test_name)
+    return _worker_state['processing'].process_test_columns(test, _worker_state['cache'])
+
+def _ordered_map(executor, fn, items, max_pending):
+    """Like executor.map, but keeps at most max_pending tasks in flight so finished rows don't pile up."""
+    pending = []
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
 
 class bandas_fft(BaseProcessing):
     """
@@ -78,22 +310,34 @@ class bandas_fft(BaseProcessing):
 
     def process_slice(self, x, y, z, test):
         num_slices = self.opts['num_slices']
-        # Apply ahryman_filter to each axis
-        fx = ahryman_filter(x, t=10/num_slices, dur=self.opts['dur'], sup=self.opts['sup'])
-        fy = ahryman_filter(y, t=10/num_slices, dur=self.opts['dur'], sup=self.opts['sup'])
-        fz = ahryman_filter(z, t=10/num_slices, dur=self.opts['dur'], sup=self.opts['sup'])
+        # Band energies of the three axes with a single FFT/reduction (same values as ahryman_filter)
+        fx, fy, fz = band_energies(np.stack((x, y, z)), t=10/num_slices, dur=self.opts['dur'], sup=self.opts['sup'], **self.fft)
         return {'x': fx, 'y': fy, 'z': fz}
 
+    def process_slices(self, block, test):
+        num_slices = self.opts['num_slices']
+        energies = band_energies(block, t=10/num_slices, dur=self.opts['dur'], sup=self.opts['sup'], **self.fft)
+        return {'x': energies[:, 0], 'y': energies[:, 1], 'z': energies[:, 2]}
+
+    def sweep_slices(self, block, test, processors):
+        # One FFT of the block, reduced with the bands of every configuration (all share num_slices, hence t)
+        t = 10/self.opts['num_slices']
+        power = power_spectrum(block, t=t, **self.fft)
+        results = []
+        for processor in processors:
+            energies = band_reduce(power, t, processor.opts['dur'], processor.opts['sup'])
+            results.append({'x': energies[:, 0], 'y': energies[:, 1], 'z': energies[:, 2]})
+        return results
 
-# Example: Time-domain statistics processing class
-from scipy.stats import skew, kurtosis
 
+# Example: Time-domain statistics processing class
 class TimeStatsProcessing(BaseProcessing):
     """
     Example processing class for time-domain statistics (RMS, skewness, kurtosis) for each axis.
     Returns features: rms_x, rms_y, rms_z, skew_x, skew_y, skew_z, kurt_x, kurt_y, kurt_z
     """
     def process_slice(self, x, y, z, test):
+        from scipy.stats import skew, kurtosis  # imported here: scipy.stats alone takes over a second to import
         return {
             'rms_x': np.sqrt(np.mean(x**2)),
             'rms_y': np.sqrt(np.mean(y**2)),
@@ -106,7 +350,56 @@ class TimeStatsProcessing(BaseProcessing):
             'kurt_z': kurtosis(z),
         }
 
+    def process_slices(self, block, test):
+        # Central moments of all slices and axes at once, along the samples axis: (num_slices, 3) each.
+        # Same definitions as scipy.stats' skew and kurtosis (biased, Fisher), sharing the centered powers.
+        rms = np.sqrt(np.mean(block**2, axis=-1))
+        centered = block - np.mean(block, axis=-1, keepdims=True)
+        squared = centered**2
+        m2 = np.mean(squared, axis=-1)
+        m3 = np.mean(squared * centered, axis=-1)
+        m4 = np.mean(squared**2, axis=-1)
+        skews = m3 / m2**1.5
+        kurts = m4 / m2**2 - 3
+        columns = {}
+        for name, values in (('rms', rms), ('skew', skews), ('kurt', kurts)):
+            for i, axis in enumerate('xyz'):
+                columns[f'{name}_{axis}'] = values[:, i]
+        return columns
+
+
+class SpectrogramProcessing(BaseProcessing):
+    """
+    Short-time spectra of every slice: frames of 'frame_length' samples every 'hop' samples (defaults 2048
+    and frame_length // 2), weighted by 'window' ('hann', 'hamming' or 'rect'). Returns x, y, z features
+    of shape (n_frames, frame_length // 2 + 1) per slice, the power spectrum of each frame, or, when the
+    opts define 'dur'/'sup', (n_frames, n_bands) band energies pooled like ahryman_filter.
+    Features are always float32, so every row has the same shape and fits a memory-mapped .npy store.
+    """
+    def __init__(self, dataset_slice, dataset_list, opts):
+        super().__init__(dataset_slice, dataset_list, opts)
+        self.frame_length = int(opts.get('frame_length', 2048))
+        self.hop = int(opts.get('hop', self.frame_length // 2))
+        self.window = opts.get('window', 'hann')
+        if self.window not in WINDOWS:
+            raise ValueError(f"Unknown window: {self.window} (expected one of {', '.join(WINDOWS)})")
+        if self.hop < 1:
+            raise ValueError(f'hop must be at least one sample (got {self.hop})')
+
+    def process_slice(self, x, y, z, test):
+        columns = self.process_slices(np.stack((x, y, z))[np.newaxis], test)
+        return {key: values[0] for key, values in columns.items()}
 
+    def process_slices(self, block, test):
+        if num_frames(block.shape[-1], self.frame_length, self.hop) == 0:
+            raise ValueError(f'Slices of {block.shape[-1]} samples are shorter than a frame ({self.frame_length})')
+        if 'dur' in self.opts:
+            features = stft_band_energies(block, frame_length=self.frame_length, hop=self.hop, window=self.window,
+                                          dur=self.opts['dur'], sup=self.opts.get('sup', 0.1), **self.fft)
+        else:
+            features = stft_power(block, self.frame_length, self.hop, self.window, **self.fft)
+        features = features.astype(np.float32, copy=False)
+        return {'x': features[:, 0], 'y': features[:, 1], 'z': features[:, 2]}
 
 
 # old version of bandas_fft for reference
@@ -0,0 +1,25 @@
+import importlib
+
+# Processing classes selectable with process_dataset.py --method, as name -> (module, class name).
+# Classes are resolved lazily: a module, and the heavy dependencies it imports, is only loaded
+# when one of its classes is actually selected.
+PROCESSING_CLASSES = {
+    'bandas_fft': ('src.processing.processing_classes', 'bandas_fft'),
+    'TimeStatsProcessing': ('src.processing.processing_classes', 'TimeStatsProcessing'),
+    'SpectrogramProcessing': ('src.processing.processing_classes', 'SpectrogramProcessing'),
+}
+
+def register_processing_class(name, module, class_name=None):
+    """Makes module.class_name available as name without importing it."""
+    PROCESSING_CLASSES[name] = (module, class_name or name)
+
+def available_processing_classes():
+    return sorted(PROCESSING_CLASSES)
+
+def get_processing_class(name):
+    """Imports and returns the processing class registered as name (or defined in processing_classes)."""
+    module, class_name = PROCESSING_CLASSES.get(name, ('src.processing.processing_classes', name))
+    try:
+        return getattr(importlib.import_module(module), class_name)
+    except (ImportError, AttributeError) as e:
+        raise Exception(f'Error loading processing class: {name}. Details: {e}')
@@ -0,0 +1,117 @@
+import numpy as np
+
+from ..core.database import VIBRATION_FS
+
+# ----------------------
+# Streaming feature extraction
+# ----------------------
+# Live x/y/z samples are copied into a preallocated ring of slice-sized slots. Whenever slots fill up, the
+# contiguous run of full slots is handed to the processing class's process_slices, exactly like a block of
+# splitVibrationBlock, so the rows are bit-identical to the batch path (see replay_test).
+
+class StreamingExtractor:
+    """
+    Online version of a processing class (e.g. bandas_fft or TimeStatsProcessing): push (channels, n) chunks
+    of samples as they arrive and get back the feature columns of every slice completed by the chunk.
+    Slices are consecutive windows of slice_length samples (default: a 10 s recording split into the
+    'num_slices' of the opts, as assumed by bandas_fft); metadata (e.g. extract_metadata of the test) is
+    repeated in every row, as in the batch output. capacity is the number of slots in the ring: a chunk
+    covering more slices is processed capacity slices at a time, so memory stays fixed.
+    running_stats() gives the mean/std/rms of every channel since the start, updated with every chunk.
+    """
+    def __init__(self, processing, slice_length=None, metadata=None, capacity=4, channels=3, fs=VIBRATION_FS):
+        self.processing = processing
+        self.slice_length = slice_length or int(round(fs * 10 / processing.opts['num_slices']))
+        self.metadata = metadata or {}
+        self.channels = channels
+        dtype = processing.dtype or np.float64
+        self._ring = np.empty((capacity, channels, self.slice_length), dtype=dtype)
+        self._count = 0
+        self._mean = np.zeros(channels)
+        self._m2 = np.zeros(channels)
+        self.reset()
+
+    def reset(self):
+        """Drops the samples of the incomplete slice and the running statistics."""
+        self._write = 0   # slot being filled
+        self._fill = 0    # samples already in it
+        self._ready = 0   # full slots not processed yet (just before _write)
+        self._count = 0
+        self._mean[:] = 0
+        self._m2[:] = 0
+
+    def push(self, chunk):
+        """Adds a (channels, n) chunk; returns the columns of the slices it completed ({} if none)."""
+        chunk = np.asarray(chunk)
+        if chunk.ndim != 2 or chunk.shape[0] != self.channels:
+            raise ValueError(f'Expected a ({self.channels}, n) chunk, got {chunk.shape}')
+        self._update_stats(chunk)
+        capacity = len(self._ring)
+        results = []
+        position = 0
+        while position < chunk.shape[1]:
+            take = min(chunk.shape[1] - position, self.slice_length - self._fill)
+            self._ring[self._write, :, self._fill:self._fill + take] = chunk[:, position:position + take]
+            self._fill += take
+            position += take
+            if self._fill == self.slice_length:
+                self._fill = 0
+                self._ready += 1
+                self._write = (self._write + 1) % capacity
+                if self._ready == capacity:
+                    results.extend(self._process_ready())
+        results.extend(self._process_ready())
+        if len(results) <= 1:
+            return results[0] if results else {}
+        return {key: np.concatenate([columns[key] for columns in results]) for key in results[0]}
+
+    def _process_ready(self):
+        # The full slots end just before _write: at most two contiguous runs of the ring (before/after wrapping)
+        capacity = len(self._ring)
+        start = (self._write - self._ready) % capacity
+        runs = [(start, min(start + self._ready, capacity))]
+        if start + self._ready > capacity:
+            runs.append((0, start + self._ready - capacity))
+        self._ready = 0
+        results = []
+        for first, last in runs:
+            if last > first:
+                block = self._ring[first:last]
+                features = self.processing.process_slices(block, None)
+                results.append(self.processing.test_columns(self.metadata, len(block), features))
+        return results
+
+    def _update_stats(self, chunk):
+        # Per-channel mean and sum of squared deviations, merged chunk by chunk (Chan et al.)
+        n = chunk.shape[1]
+        if n == 0:
+            return
+        mean = chunk.mean(axis=1)
+        m2 = np.square(chunk - mean[:, np.newaxis]).sum(axis=1)
+        total = self._count + n
+        delta = mean - self._mean
+        self._mean += delta * (n / total)
+        self._m2 += m2 + delta**2 * (self._count * n / total)
+        self._count = total
+
+    def running_stats(self):
+        """Mean, std and rms of every channel over all the samples pushed since the start (or reset)."""
+        if self._count == 0:
+            return {stat: np.full(self.channels, np.nan) for stat in ('mean', 'std', 'rms')}
+        variance = self._m2 / self._count
+        return {'mean': self._mean.copy(), 'std': np.sqrt(variance), 'rms': np.sqrt(variance + self._mean**2)}
+
+
+def replay_test(processing, test, chunk_size=4096, capacity=4):
+    """
+    Replays the recording of a test through a StreamingExtractor in chunk_size pieces and returns
+    (streamed columns, batch columns of processing.process_test), which must be identical.
+    """
+    num_slices = processing.opts['num_slices']
+    signal = test.returnVibrationArray(("x", "y", "z"), processing.dtype)
+    metadata = processing.extract_metadata(test)
+    stream = StreamingExtractor(processing, signal.shape[1] // num_slices, metadata, capacity)
+    results = [stream.push(signal[:, start:start + chunk_size]) for start in range(0, signal.shape[1], chunk_size)]
+    results = [columns for columns in results if columns]
+    streamed = {key: np.concatenate([columns[key] for columns in results]) for key in results[0]} if results else {}
+    return streamed, processing.process_test(test)
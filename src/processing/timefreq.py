@@ -0,0 +1,67 @@
+import numpy as np
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .fft import _spectrum_into, _spectrum_shape, _real_dtype, _workspace, band_reduce
+
+# ----------------------
+# Short-time spectra
+# ----------------------
+# Frames are strided views of the slice (sliding_window_view), so the samples are never copied into a
+# frame matrix: the only pass over them multiplies by the window into a reused workspace buffer, which
+# then goes through a single rfft for every frame of every slice and axis.
+WINDOWS = ['hann', 'hamming', 'rect']
+
+@lru_cache(maxsize=16)
+def frame_window(window='hann', frame_length=2048, dtype=np.float64):
+    """Periodic analysis window of frame_length points (read-only, shared by all calls)."""
+    if window not in WINDOWS:
+        raise ValueError(f'Unknown window: {window} (expected one of {", ".join(WINDOWS)})')
+    phase = 2 * np.pi * np.arange(frame_length) / frame_length
+    if window == 'hann':
+        values = 0.5 - 0.5 * np.cos(phase)
+    elif window == 'hamming':
+        values = 0.54 - 0.46 * np.cos(phase)
+    else:
+        values = np.ones(frame_length)
+    values = values.astype(dtype)
+    values.flags.writeable = False
+    return values
+
+def num_frames(n_samples, frame_length=2048, hop=1024):
+    return 1 + (n_samples - frame_length) // hop if n_samples >= frame_length else 0
+
+def frame_view(y, frame_length=2048, hop=1024):
+    """(..., n_frames, frame_length) view of the frames of y along its last axis, hop samples apart (no copy)."""
+    y = np.asarray(y)
+    if y.shape[-1] < frame_length:
+        raise ValueError(f'Signals of {y.shape[-1]} samples are shorter than a frame ({frame_length})')
+    return sliding_window_view(y, frame_length, axis=-1)[..., ::hop, :]
+
+def stft_power(block, frame_length=2048, hop=1024, window='hann', out=None, backend=None, threads=None):
+    """
+    Power spectra (..., n_frames, frame_length // 2 + 1) of the windowed frames of every signal in block,
+    e.g. a whole (n_slices, 3, n_samples) test, with one rfft. Each frame is scaled like raw_fft, squared.
+    out='workspace' computes them in a reused buffer, overwritten by the next call with the same shape.
+    """
+    block = np.asarray(block)
+    dtype = _real_dtype(block)
+    frames = frame_view(block, frame_length, hop)
+    if window != 'rect':
+        windowed = _workspace(frames.shape, dtype)
+        np.multiply(frames, frame_window(window, frame_length, dtype), out=windowed)
+        frames = windowed
+    shape = _spectrum_shape(frames, frame_length)
+    power = _workspace(shape, dtype) if out == 'workspace' else np.empty(shape, dtype)
+    _spectrum_into(frames, frame_length, power, backend, threads)
+    np.square(power, out=power)
+    return power
+
+def stft_band_energies(block, Fs=51200, frame_length=2048, hop=1024, window='hann', dur=200, sup=0.1,
+                       backend=None, threads=None):
+    """Band energies (..., n_frames, n_bands) of every frame, pooled with the band layout of band_energies."""
+    t = frame_length / Fs  # a frame spectrum has points every Fs / frame_length Hz, like a t-second FFT
+    if round(dur * t) < 1:
+        raise ValueError(f'Bands of {dur} Hz are narrower than the {Fs / frame_length:g} Hz frame resolution')
+    power = stft_power(block, frame_length, hop, window, 'workspace', backend, threads)
+    return band_reduce(power, t, dur, sup)
@@ -0,0 +1,33 @@
+# Adds the per-test summary attrs (numericalMeasurements mean/std/min/max, vibrationMeasurements rms; see
+# src/core/test_summary.py) to an HDF5 dataset converted before convert_from_files.py stored them.
+# The file is modified in place, so its cached metadata index (and feature cache entries) are rebuilt on next use.
+#
+# Usage (from the repository root):
+#   python -m src.utils.backfill_summaries <dataset.hdf5> [--force]
+
+import argparse
+import h5py
+import tqdm
+
+from src.core.test_summary import has_summary, summarize_test
+
+def backfill_summaries(path, force=False):
+    """Writes the summary attrs of every test that doesn't have them (or of all tests with force). Returns the count."""
+    updated = 0
+    with h5py.File(path, 'a') as f:
+        testNames = [f[unitKey][testKey].name for unitKey in f.keys() for testKey in f[unitKey].keys()]
+        for testName in tqdm.tqdm(testNames, desc="Teste"):
+            testGroup = f[testName]
+            if 'numericalMeasurements' not in testGroup or (has_summary(testGroup) and not force):
+                continue
+            summarize_test(testGroup)
+            updated += 1
+    return updated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Store per-test summary statistics in an existing HDF5 dataset.')
+    parser.add_argument('dataset', help='HDF5 dataset to update in place')
+    parser.add_argument('--force', action='store_true', help='Recompute the summaries of tests that already have them')
+    args = parser.parse_args()
+    print(f'Summaries written for {backfill_summaries(args.dataset, args.force)} tests')
@@ -0,0 +1,42 @@
+# Converts a processed output (.h5 written by FeatureWriter, or a pickled DataFrame) into a memory-mappable
+# feature store: one .npy file per column plus store.json (see src/core/npy_store.py).
+#
+# Usage (from the repository root):
+#   python -m src.utils.export_features processed_datasets/<method>/<slice>.h5 processed_datasets/<method>/<slice>
+#   python -m src.utils.export_features processed_datasets/<method>/<slice>.pkl processed_datasets/<method>/<slice>
+
+import argparse
+import numpy as np
+
+from src.core.feature_store import read_feature_columns, read_feature_tests
+from src.core.npy_store import NpyFeatureWriter
+
+def dataframe_columns(df):
+    """NumPy columns of a process() DataFrame: object columns holding arrays are stacked into (rows, ...) arrays."""
+    return {key: np.stack(df[key].to_numpy()) if df[key].dtype == object else df[key].to_numpy() for key in df.columns}
+
+def export_features(source, destination):
+    """Writes the features in source to the store directory destination; returns the number of rows."""
+    with NpyFeatureWriter(destination) as writer:
+        if source.endswith('.h5'):
+            columns = read_feature_columns(source)
+            testNames, testEnd = read_feature_tests(source)
+            start = 0
+            for testName, end in zip(testNames, testEnd):
+                writer.append({key: values[start:end] for key, values in columns.items()}, testName)
+                start = end
+        else:
+            import pandas as pd
+            df = pd.read_pickle(source)
+            if len(df):
+                # The pickled DataFrame doesn't record which test produced each row
+                writer.append(dataframe_columns(df))
+        return writer.num_rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert processed features into a memory-mappable .npy store.')
+    parser.add_argument('source', help='FeatureWriter .h5 file or pickled DataFrame')
+    parser.add_argument('destination', help='Store directory to write')
+    args = parser.parse_args()
+    print(f'Exported {export_features(args.source, args.destination)} rows to {args.destination}')
@@ -0,0 +1,132 @@
+# Merges the partial outputs of process_dataset.py --shard i/N runs (one per machine) into the output of the
+# whole slice, with the tests in the same order as an unsharded run.
+#
+# Before anything is written, every shard manifest is checked: same method/config/slice/parameters, shards
+# 0..N-1 each present once, the same slice test list, and every shard complete (all its tests written, with
+# the row counts its manifest recorded). The merged output gets the manifest of a normal complete run.
+#
+# Usage (from the repository root):
+#   python -m src.utils.merge_shards processed_datasets/<method>/<slice>.h5 [<shard> ...]
+#   python -m src.utils.merge_shards processed_datasets/<method>/<slice> [<shard> ...]      (npy stores)
+# Without shard paths, the <slice>.shard-i-of-N outputs next to the merged output are used.
+
+import os
+import glob
+import argparse
+import h5py
+import numpy as np
+
+from src.core.feature_store import FeatureWriter
+from src.core.npy_store import NpyFeatureWriter, FeatureStore
+from src.core.run_manifest import RunManifest
+from src.core.sharding import select_shard
+
+
+class ShardReader:
+    """Test table and per-test rows of a partial output (FeatureWriter .h5 file or npy store directory)."""
+    def __init__(self, path):
+        self.path = path
+        if os.path.isdir(path):
+            self._file = None
+            self._store = FeatureStore(path)
+            self.test_names = list(self._store.tests)
+            self.test_end = self._store.test_end
+        else:
+            self._file = h5py.File(path, 'r', libver='latest', swmr=True)
+            self._store = None
+            self.test_names = list(self._file['_tests'].asstr()[:]) if '_tests' in self._file else []
+            self.test_end = self._file['_test_end'][:] if '_test_end' in self._file else np.zeros(0, dtype=np.int64)
+
+    @property
+    def num_rows(self):
+        return int(self.test_end[-1]) if len(self.test_end) else 0
+
+    def test_rows(self, i):
+        """Columns of the rows of the i-th test."""
+        start, end = (int(self.test_end[i - 1]) if i else 0), int(self.test_end[i])
+        if self._store is not None:
+            return {key: np.asarray(values) for key, values in self._store.rows(slice(start, end)).items()}
+        return {key: self._file[key][start:end] for key in self._file.attrs['columns']}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def find_shards(output):
+    """Partial outputs <output>.shard-i-of-N(.h5) next to output."""
+    base, extension = (output[:-3], '.h5') if output.endswith('.h5') else (output.rstrip('/'), '')
+    return sorted(path for path in glob.glob(f'{glob.escape(base)}.shard-*-of-*{extension}')
+                  if not path.endswith('.json') and not path.endswith('.tmp'))
+
+def check_shards(shard_paths):
+    """Validates the shard manifests and returns (key without shard, slice tests, {index: (path, manifest)})."""
+    manifests = {}
+    key = sliceTests = count = None
+    for path in shard_paths:
+        saved = RunManifest.read(f'{path}.manifest.json')
+        if saved is None or 'shard' not in saved['key'] or saved.get('slice_tests') is None:
+            raise ValueError(f'{path} has no shard manifest (was it written with --shard?)')
+        shardKey = dict(saved['key'])
+        index, shardCount = shardKey.pop('shard')
+        if key is None:
+            key, sliceTests, count = shardKey, saved['slice_tests'], shardCount
+        elif shardKey != key or shardCount != count:
+            raise ValueError(f'{path} belongs to another run ({shardKey}, {shardCount} shards) than {shard_paths[0]} ({key}, {count} shards)')
+        elif saved['slice_tests'] != sliceTests:
+            raise ValueError(f'{path} was run on a different list of tests than {shard_paths[0]}')
+        if index in manifests:
+            raise ValueError(f'Shard {index}/{count} is given twice: {manifests[index][0]} and {path}')
+        manifests[index] = (path, saved)
+    if key is None:
+        raise ValueError('No shards to merge')
+    missing = sorted(set(range(count)) - set(manifests))
+    if missing:
+        raise ValueError(f'Missing shards: {", ".join(f"{i}/{count}" for i in missing)}')
+    for index, (path, saved) in manifests.items():
+        expected = select_shard(sliceTests, index, count)
+        if saved['completed'] != expected:
+            raise ValueError(f'{path} is incomplete: {len(saved["completed"])} of {len(expected)} tests written')
+    return key, sliceTests, manifests
+
+def merge_shards(output, shard_paths):
+    """Writes the rows of every shard to output in the slice's test order; returns the number of rows."""
+    key, sliceTests, manifests = check_shards(shard_paths)
+    readers = {}
+    try:
+        location = {}
+        for index, (path, saved) in manifests.items():
+            reader = readers[index] = ShardReader(path)
+            if reader.test_names != saved['completed'] or reader.num_rows != saved['num_rows']:
+                raise ValueError(f'{path} does not match its manifest ({len(reader.test_names)} tests, {reader.num_rows} rows '
+                                 f'written; {len(saved["completed"])} tests, {saved["num_rows"]} rows recorded)')
+            for i, testName in enumerate(reader.test_names):
+                location[testName] = (reader, i)
+        # Same key as an unsharded run of the slice (the parameters themselves are only stored as their hash)
+        manifest = RunManifest(f'{output}.manifest.json', key['method'], key['config'], key['slice'], {}, total_tests=len(sliceTests))
+        manifest.key['config_hash'] = key['config_hash']
+        manifest.save()
+        Writer = FeatureWriter if output.endswith('.h5') else NpyFeatureWriter
+        with Writer(output, manifest=manifest) as writer:
+            for testName in sliceTests:
+                reader, i = location[testName]
+                writer.append(reader.test_rows(i), testName)
+            numRows = writer.num_rows
+    finally:
+        for reader in readers.values():
+            reader.close()
+    expectedRows = sum(saved['num_rows'] for _, saved in manifests.values())
+    if numRows != expectedRows:
+        raise ValueError(f'Merged output has {numRows} rows, the shards have {expectedRows}')
+    return numRows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merge the outputs of process_dataset.py --shard runs.')
+    parser.add_argument('output', help='Merged .h5 file or npy store directory to write')
+    parser.add_argument('shards', nargs='*', help='Shard outputs (default: <output>.shard-i-of-N next to it)')
+    args = parser.parse_args()
+
+    shards = args.shards or find_shards(args.output)
+    print(f'Merging {len(shards)} shards into {args.output}')
+    print(f'Merged {merge_shards(args.output, shards)} rows into {args.output}')
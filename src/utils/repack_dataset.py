@@ -0,0 +1,137 @@
+# Rewrites an existing VSS HDF5 dataset with a layout tuned for slice reads.
+#
+# convert_from_files.py stores vibrationMeasurements as (N, 3) rows (x, y, z interleaved) with gzip+shuffle
+# and automatic chunking, so reading one axis or one time window decompresses whole chunks of all axes.
+# This tool stores vibrationMeasurements axis-major, as (3, N), with chunks of one axis and chunk_samples
+# samples (by default one slice of a 10 s recording split in 10), optionally with a faster codec.
+# The geometry is recorded in the dataset attrs ('layout', 'chunkSamples', 'codec') and VSS_Test_Reference
+# reads both layouts transparently. Everything else (groups, attrs, numericalMeasurements) is copied as is.
+#
+# Usage (from the repository root):
+#   python -m src.utils.repack_dataset <input.hdf5> <output.hdf5> [--codec lzf] [--chunk-samples 51200]
+#   python -m src.utils.repack_dataset <input.hdf5> --benchmark [--benchmark-tests 5]
+#
+# Codecs: gzip (same as the original files), lzf (bundled with h5py), none, and blosc-lz4/blosc-zstd
+# when the optional hdf5plugin package is installed (readers then need hdf5plugin installed as well).
+
+import os
+import time
+import argparse
+import tempfile
+import h5py
+import numpy as np
+import tqdm
+
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+from src.core.database import VSS_File
+
+CODECS = ['gzip', 'lzf', 'none', 'blosc-lz4', 'blosc-zstd']
+
+def codec_options(codec):
+    """h5py create_dataset keyword arguments for a codec name."""
+    if codec == 'gzip':
+        return dict(compression='gzip', shuffle=True)
+    if codec == 'lzf':
+        return dict(compression='lzf', shuffle=True)
+    if codec == 'none':
+        return {}
+    if codec.startswith('blosc-'):
+        if hdf5plugin is None:
+            raise ValueError(f'Codec {codec} requires the hdf5plugin package')
+        return dict(hdf5plugin.Blosc(cname=codec.split('-', 1)[1], clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE))
+    raise ValueError(f'Unknown codec: {codec}')
+
+def available_codecs():
+    return [codec for codec in CODECS if not codec.startswith('blosc-') or hdf5plugin is not None]
+
+def repack_vibration(source, destinationGroup, codec='lzf', chunk_samples=51200):
+    """Writes the vibrationMeasurements dataset `source` axis-major into destinationGroup."""
+    if source.attrs.get('layout') == 'axis-major':
+        data = source[()]
+    else:
+        data = np.ascontiguousarray(source[()].T)
+    chunks = (1, max(1, min(chunk_samples, data.shape[1])))
+    dataset = destinationGroup.create_dataset('vibrationMeasurements', data=data, chunks=chunks, **codec_options(codec))
+    for key, value in source.attrs.items():
+        dataset.attrs[key] = value
+    dataset.attrs['layout'] = 'axis-major'
+    dataset.attrs['chunkSamples'] = chunks[1]
+    dataset.attrs['codec'] = codec
+    return dataset
+
+def repack_file(inputPath, outputPath, codec='lzf', chunk_samples=51200, testNames=None):
+    """Copies inputPath to outputPath, repacking every vibrationMeasurements dataset (or only those of testNames)."""
+    with h5py.File(inputPath, 'r') as fIn, h5py.File(outputPath, 'w') as fOut:
+        for key, value in fIn.attrs.items():
+            fOut.attrs[key] = value
+        for unitKey in tqdm.tqdm(list(fIn.keys()), desc="Compressor", position=0):
+            unitIn = fIn[unitKey]
+            unitOut = fOut.create_group(unitKey)
+            for key, value in unitIn.attrs.items():
+                unitOut.attrs[key] = value
+            for testKey in tqdm.tqdm(list(unitIn.keys()), desc="      Teste", leave=False, position=1):
+                testIn = unitIn[testKey]
+                if testNames is not None and testIn.name not in testNames:
+                    continue
+                testOut = unitOut.create_group(testKey)
+                for key, value in testIn.attrs.items():
+                    testOut.attrs[key] = value
+                for name in testIn.keys():
+                    if name == 'vibrationMeasurements':
+                        repack_vibration(testIn[name], testOut, codec, chunk_samples)
+                    else:
+                        fIn.copy(testIn[name], testOut, name=name)
+
+def benchmark(inputPath, codecs=None, chunk_samples=51200, num_tests=5, num_slices=10):
+    """
+    Repacks the first num_tests tests with every codec into temporary files and measures how fast
+    splitVibrationBlock reads them (MB of decompressed float data per second), against the original file.
+    """
+    codecs = available_codecs() if codecs is None else codecs
+    with h5py.File(inputPath, 'r') as f:
+        testNames = [f[unit][test].name for unit in f.keys() for test in f[unit].keys()][:num_tests]
+    results = []
+    with tempfile.TemporaryDirectory() as tmpDir:
+        variants = [('original', inputPath)]
+        for codec in codecs:
+            path = os.path.join(tmpDir, f'{codec}.hdf5')
+            repack_file(inputPath, path, codec, chunk_samples, set(testNames))
+            variants.append((codec, path))
+        for label, path in variants:
+            dataset = VSS_File(path, useIndex=False)
+            tests = [dataset.returnTestReference(name) for name in testNames]
+            nbytes = 0
+            start = time.perf_counter()
+            for test in tests:
+                nbytes += test.splitVibrationBlock(num_slices).nbytes
+            elapsed = time.perf_counter() - start
+            datasets = [test._h5ref['vibrationMeasurements'] for test in tests]
+            raw = sum(d.size * d.dtype.itemsize for d in datasets)
+            stored = sum(d.id.get_storage_size() for d in datasets)
+            results.append({'codec': label, 'MB/s': nbytes / elapsed / 1e6, 'ratio': raw / max(stored, 1)})
+            dataset.close()
+    for result in results:
+        print(f"{result['codec']:>12}: {result['MB/s']:8.1f} MB/s decompressed, compression ratio {result['ratio']:.2f}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Repack vibrationMeasurements axis-major with slice-aligned chunks.')
+    parser.add_argument('input', help='Existing HDF5 dataset')
+    parser.add_argument('output', nargs='?', help='Repacked HDF5 dataset to write')
+    parser.add_argument('--codec', choices=CODECS, default='lzf', help='Compression codec for vibrationMeasurements')
+    parser.add_argument('--chunk-samples', type=int, default=51200, help='Samples per chunk (one slice by default)')
+    parser.add_argument('--benchmark', action='store_true', help='Measure read throughput of every available codec')
+    parser.add_argument('--benchmark-tests', type=int, default=5, help='Number of tests used by --benchmark')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.input, chunk_samples=args.chunk_samples, num_tests=args.benchmark_tests)
+    elif args.output:
+        repack_file(args.input, args.output, args.codec, args.chunk_samples)
+    else:
+        parser.error('an output path is required unless --benchmark is given')
@@ -0,0 +1,93 @@
+# Generates a train/val split of a processed output, replacing the fixed-size random split of generate_indices.py.
+#
+# The number of rows and the groups come from the output itself (npy store directory, FeatureWriter .h5 or pickled
+# DataFrame). With --by test/unit/rpm whole groups go to one side, so slices of the same test can't leak from train
+# into val; --stratify keeps about --val-fraction of the rows of every unit/rpm value in val.
+# The split is saved as a boolean .npy mask (True = validation row), loaded with load_split without any JSON parsing.
+#
+# Usage (from the repository root):
+#   python -m src.utils.split_dataset processed_datasets/<method>/<slice> split.npy [--by test] [--stratify rpm]
+#                                     [--val-fraction 0.2] [--seed 42]
+
+import argparse
+import numpy as np
+
+GROUPINGS = ['row', 'test', 'unit', 'rpm']
+
+def read_split_columns(source):
+    """Row count and grouping columns (test index, unit, rpm) of a processed output."""
+    if source.endswith('.h5'):
+        from src.core.feature_store import read_feature_columns, read_feature_tests
+        columns = read_feature_columns(source, columns=('unit', 'rpm'))  # not the feature columns
+        testEnd = read_feature_tests(source)[1]
+        numRows = int(testEnd[-1]) if len(testEnd) else 0
+    elif source.endswith('.pkl'):
+        import pandas as pd
+        df = pd.read_pickle(source)
+        columns = {key: df[key].to_numpy() for key in ('unit', 'rpm') if key in df}
+        numRows, testEnd = len(df), None  # pickled DataFrames don't record the tests
+    else:
+        from src.core.npy_store import FeatureStore
+        store = FeatureStore(source)
+        columns = {key: np.asarray(store[key]) for key in ('unit', 'rpm') if key in store.keys()}
+        numRows, testEnd = len(store), store.test_end
+    groups = {'row': np.arange(numRows)}
+    if testEnd is not None:
+        groups['test'] = np.repeat(np.arange(len(testEnd)), np.diff(testEnd, prepend=0))
+    for key in ('unit', 'rpm'):
+        if key in columns:
+            groups[key] = columns[key][:numRows]
+    return numRows, groups
+
+def group_split(groups, val_fraction=0.2, seed=42, strata=None):
+    """
+    Boolean validation mask: whole groups (rows with equal values in groups) are drawn at random until about
+    val_fraction of the rows, separately within every value of strata.
+    """
+    rng = np.random.default_rng(seed)
+    mask = np.zeros(len(groups), dtype=bool)
+    if strata is None:
+        strata = np.zeros(len(groups), dtype=np.int8)
+    for stratum in np.unique(strata):
+        rows = np.flatnonzero(strata == stratum)
+        uniqueGroups, inverse, counts = np.unique(groups[rows], return_inverse=True, return_counts=True)
+        order = rng.permutation(len(uniqueGroups))
+        cumulative = np.cumsum(counts[order])
+        target = val_fraction * len(rows)
+        # Number of groups whose total row count is closest to the target (at least one if train keeps one too)
+        k = int(np.argmin(np.abs(np.concatenate(([0], cumulative)) - target)))
+        if k == 0 and len(uniqueGroups) > 1 and val_fraction > 0:
+            k = 1
+        valGroups = np.zeros(len(uniqueGroups), dtype=bool)
+        valGroups[order[:k]] = True
+        mask[rows] = valGroups[inverse.ravel()]
+    return mask
+
+def save_split(path, mask):
+    np.save(path, np.asarray(mask, dtype=bool))
+
+def load_split(path):
+    """(train_indices, val_indices) of a split saved by save_split."""
+    mask = np.load(path)
+    return np.flatnonzero(~mask), np.flatnonzero(mask)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a grouped/stratified train/val split of a processed output.')
+    parser.add_argument('source', help='npy store directory, FeatureWriter .h5 file or pickled DataFrame')
+    parser.add_argument('output', help='Boolean .npy mask to write (True = validation)')
+    parser.add_argument('--by', choices=GROUPINGS, default='test', help='Rows of the same group stay on the same side')
+    parser.add_argument('--stratify', choices=['unit', 'rpm'], default=None, help='Split every unit/rpm value separately')
+    parser.add_argument('--val-fraction', type=float, default=0.2, help='Fraction of the rows in the validation set')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.by == args.stratify:
+        parser.error('--by and --stratify must be different')
+    numRows, groups = read_split_columns(args.source)
+    for key in [args.by, args.stratify]:
+        if key is not None and key not in groups:
+            parser.error(f'{args.source} has no {key} information to split by')
+    mask = group_split(groups[args.by], args.val_fraction, args.seed, groups[args.stratify] if args.stratify else None)
+    save_split(args.output, mask)
+    print(f'Saved {numRows - mask.sum()} training and {mask.sum()} validation rows ({args.by} groups) to {args.output}')